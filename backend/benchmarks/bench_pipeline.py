@@ -0,0 +1,363 @@
+"""
+Latency, throughput and memory of upload, detect, redact and download over
+the synthetic corpus, called in-process and through the ASGI app.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pipeline [--profile quick|full] [--repeat 5]
+                                        [--mode both|inproc|asgi] [--output results.json]
+    python -m benchmarks.bench_pipeline --compare before.json after.json
+
+Storage and caches live in a scratch directory, and the detection and OCR
+caches are cleared before every detect (unless --warm-cache), so each run
+measures real work. Peak RSS is the high-water mark of the process (and,
+separately, of the OCR workers) during each stage: it is reset through
+/proc/<pid>/clear_refs before a stage starts, so it is only reported on
+Linux.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from benchmarks.corpus import PROFILES, generate_corpus
+
+STAGES = ("upload", "detect", "redact", "download")
+
+def percentile(values: list, q: float) -> float:
+    """Linear-interpolated percentile of values (q in 0..100)"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def child_pids() -> list:
+    """Live child processes (the OCR pool's workers), from /proc"""
+    pids = []
+    for path in glob.glob("/proc/self/task/*/children"):
+        try:
+            with open(path) as f:
+                pids.extend(f.read().split())
+        except OSError:
+            pass
+    return pids
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the RSS high-water mark (VmHWM) of this process and its
+    children, so the next reading covers one stage. Linux only; False
+    where it cannot be done.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    for pid in child_pids():
+        try:
+            with open(f"/proc/{pid}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+    return True
+
+def high_water_mb(pid: str) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def peak_rss_mb() -> dict:
+    """
+    High-water RSS in MB of this process and, summed, of its live
+    children since reset_peak_rss()
+    """
+    return {
+        "self": round(high_water_mb("self"), 1),
+        "children": round(sum(high_water_mb(pid) for pid in child_pids()), 1)
+    }
+
+def summarize(samples: list) -> dict:
+    """samples: [(seconds, document entry), ...]"""
+    seconds = [s for s, _ in samples]
+    total = sum(seconds)
+    pages = sum(document["pages"] for _, document in samples)
+    size = sum(document["size"] for _, document in samples)
+    return {
+        "runs": len(samples),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "mean_ms": round(total / len(samples) * 1000, 3) if samples else 0.0,
+        "min_ms": round(min(seconds) * 1000, 3) if samples else 0.0,
+        "max_ms": round(max(seconds) * 1000, 3) if samples else 0.0,
+        "docs_per_s": round(len(samples) / total, 3) if total else None,
+        "pages_per_s": round(pages / total, 3) if total else None,
+        "mb_per_s": round(size / (1024 * 1024) / total, 3) if total else None
+    }
+
+def normalized(value: str) -> str:
+    return re.sub(r"[^0-9a-z]", "", value.lower())
+
+def recall(document: dict, detected: dict) -> float:
+    """Share of the document's known PII values that detection returned"""
+    expected = {normalized(value) for value in document.get("pii_values", [])}
+    if not expected:
+        return None
+    found = {normalized(value) for values in detected.values() for value in values}
+    return round(len(expected & found) / len(expected), 4)
+
+class InProcessPipeline:
+    """The stages as the routers run them, without HTTP"""
+    name = "inproc"
+
+    def __init__(self):
+        from routers.detect import detect_sensitive_data_debug
+        from routers.redact import RedactionRequest, SAVE_MODES, DEFAULT_SAVE_MODE, redact_file
+        from services.storage import content_store
+        self.detect_sensitive_data_debug = detect_sensitive_data_debug
+        self.RedactionRequest = RedactionRequest
+        self.save_options = SAVE_MODES[DEFAULT_SAVE_MODE]
+        self.redact_file = redact_file
+        self.store = content_store
+
+    def upload(self, path: str) -> str:
+        file_id = str(uuid.uuid4())
+        tmp_path = self.store.temp_path(".part")
+        shutil.copyfile(path, tmp_path)
+        self.store.put_file(file_id, "upload", tmp_path)
+        return file_id
+
+    def detect(self, file_id: str) -> dict:
+        result = self.detect_sensitive_data_debug(self.store.path_for(file_id, "upload"), use_cache=False)
+        return result["detected_data"]
+
+    def redact(self, file_id: str, detected: dict):
+        request = self.RedactionRequest(items_to_redact=detected)
+        self.redact_file(file_id, self.store.path_for(file_id, "upload"), request, self.save_options)
+
+    def download(self, file_id: str) -> int:
+        return sum(len(chunk) for chunk in self.store.iter_bytes(file_id, "redacted"))
+
+    def close(self):
+        pass
+
+class AsgiPipeline:
+    """The stages through the FastAPI app and its routing, middleware and serialization"""
+    name = "asgi"
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        from main import app
+        self.client = TestClient(app)
+        self.client.__enter__()
+
+    @staticmethod
+    def _check(response):
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.request.method} {response.request.url} -> "
+                               f"{response.status_code}: {response.text[:200]}")
+        return response
+
+    def upload(self, path: str) -> str:
+        with open(path, "rb") as f:
+            response = self._check(self.client.post(
+                "/upload/", files={"file": (os.path.basename(path), f, "application/pdf")}
+            ))
+        return response.json()["file_id"]
+
+    def detect(self, file_id: str) -> dict:
+        return self._check(self.client.post(f"/data/{file_id}", params={"use_cache": False})).json()["detected_data"]
+
+    def redact(self, file_id: str, detected: dict):
+        self._check(self.client.post(f"/redact/{file_id}", json={"items_to_redact": detected}))
+
+    def download(self, file_id: str) -> int:
+        return len(self._check(self.client.get(f"/download/{file_id}")).content)
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+
+def clear_caches():
+    from services.cache import detection_cache, ocr_page_cache
+    detection_cache.clear()
+    ocr_page_cache.clear()
+
+def run_mode(pipeline, documents: list, corpus_dir: str, repeat: int, warm_cache: bool) -> dict:
+    """
+    Run each stage over every document repeat times, one stage at a time,
+    so each stage's peak RSS can be read after it
+    """
+    measure_memory = reset_peak_rss()
+    runs = [(document, iteration) for document in documents for iteration in range(repeat)]
+    state = {}  # (file, iteration) -> {"file_id", "detected"}
+    timings = {stage: [] for stage in STAGES}
+    memory = {}
+    recalls = {}
+
+    for stage in STAGES:
+        reset_peak_rss()
+        for document, iteration in runs:
+            key = (document["file"], iteration)
+            if stage == "detect" and not warm_cache:
+                clear_caches()
+            start = time.perf_counter()
+            if stage == "upload":
+                state[key] = {"file_id": pipeline.upload(os.path.join(corpus_dir, document["file"]))}
+            elif stage == "detect":
+                state[key]["detected"] = pipeline.detect(state[key]["file_id"])
+            elif stage == "redact":
+                pipeline.redact(state[key]["file_id"], state[key]["detected"])
+            else:
+                pipeline.download(state[key]["file_id"])
+            timings[stage].append((time.perf_counter() - start, document))
+            if stage == "detect":
+                recalls[document["file"]] = recall(document, state[key]["detected"])
+        memory[stage] = peak_rss_mb() if measure_memory else None
+        print(f"  {pipeline.name:<7} {stage:<9} {summarize(timings[stage])['p50_ms']:>10.1f} ms p50", flush=True)
+
+    results = {}
+    for stage in STAGES:
+        results[stage] = summarize(timings[stage])
+        results[stage]["peak_rss_mb"] = memory[stage]
+        results[stage]["documents"] = {
+            document["file"]: summarize([sample for sample in timings[stage] if sample[1] is document])
+            for document in documents
+        }
+    for document in documents:
+        results["detect"]["documents"][document["file"]]["recall"] = recalls[document["file"]]
+    scored = [value for value in recalls.values() if value is not None]
+    results["detect"]["recall"] = round(sum(scored) / len(scored), 4) if scored else None
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment() -> dict:
+    import fitz  # PyMuPDF
+    from services import ocr, ocr_engine
+    from services.storage_backends import STORAGE_BACKEND
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "ocr_mode": ocr.OCR_MODE,
+            "ocr_workers": ocr.OCR_WORKERS,
+            "ocr_engine": ocr_engine.get_engine(ocr.OCR_LANG).name,
+            "storage_backend": STORAGE_BACKEND
+        }
+    }
+
+def compare(before_path: str, after_path: str):
+    """Print p50/p99 and throughput changes between two result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['environment'].get('commit') or before_path} -> {after['environment'].get('commit') or after_path}")
+    print(f"{'mode':<7} {'stage':<9} {'p50 ms':>21} {'p99 ms':>21} {'p50 %':>8}")
+    for mode, stages in after["results"].items():
+        for stage, new in stages.items():
+            old = before["results"].get(mode, {}).get(stage)
+            if old is None:
+                continue
+            change = (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            line = (f"{mode:<7} {stage:<9} {old['p50_ms']:>9.1f} -> {new['p50_ms']:>9.1f} "
+                    f"{old['p99_ms']:>9.1f} -> {new['p99_ms']:>9.1f} {change:>+7.1f}%")
+            if new.get("recall") is not None and old.get("recall") is not None:
+                line += f"  recall {old['recall']:.3f} -> {new['recall']:.3f}"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--corpus", default=os.path.join("benchmarks", "corpus"), help="where generated PDFs are kept")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per document and stage")
+    parser.add_argument("--mode", choices=("both", "inproc", "asgi"), default="both")
+    parser.add_argument("--ocr-mode", choices=("adaptive", "fixed"), help="override OCR_MODE")
+    parser.add_argument("--warm-cache", action="store_true", help="keep detection and OCR caches between runs")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    documents = generate_corpus(args.corpus, args.profile, args.seed)
+
+    # Keep the benchmark's files away from the real storage and caches;
+    # these are read when the app modules are first imported
+    scratch = tempfile.mkdtemp(prefix="pdf-bench-")
+    os.environ["STORAGE_DIR"] = os.path.join(scratch, "storage")
+    os.environ["STORAGE_DB_PATH"] = os.path.join(scratch, "storage", "storage.sqlite3")
+    os.environ["DETECTION_CACHE_DIR"] = os.path.join(scratch, "cache", "detections")
+    os.environ["OCR_CACHE_PATH"] = os.path.join(scratch, "cache", "ocr_pages.sqlite3")
+    if args.ocr_mode:
+        os.environ["OCR_MODE"] = args.ocr_mode
+
+    report = {
+        "environment": environment(),
+        "corpus": {
+            "profile": args.profile,
+            "seed": args.seed,
+            "documents": [{k: v for k, v in document.items() if k != "pii_values"} for document in documents]
+        },
+        "repeat": args.repeat,
+        "warm_cache": args.warm_cache,
+        "results": {}
+    }
+    modes = [InProcessPipeline, AsgiPipeline] if args.mode == "both" else \
+        [InProcessPipeline if args.mode == "inproc" else AsgiPipeline]
+    try:
+        for mode in modes:
+            pipeline = mode()
+            try:
+                report["results"][pipeline.name] = run_mode(
+                    pipeline, documents, args.corpus, args.repeat, args.warm_cache
+                )
+            finally:
+                pipeline.close()
+    finally:
+        from services import ocr
+        ocr.shutdown_ocr_pool()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"\n{'mode':<7} {'stage':<9} {'p50 ms':>10} {'p99 ms':>10} {'docs/s':>8} {'pages/s':>9} {'peak MB':>8} {'recall':>7}")
+    for mode, stages in report["results"].items():
+        for stage, stats in stages.items():
+            score = f"{stats['recall']:.3f}" if stats.get("recall") is not None else ""
+            peak = stats["peak_rss_mb"]
+            print(f"{mode:<7} {stage:<9} {stats['p50_ms']:>10.1f} {stats['p99_ms']:>10.1f} "
+                  f"{stats['docs_per_s'] or 0:>8.2f} {stats['pages_per_s'] or 0:>9.1f} "
+                  f"{peak['self'] if peak else float('nan'):>8.1f} {score:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Throughput of the scanner against the old per-pattern loop, both as it
+was (re.findall: values only) and with the offsets the scanner returns
+(re.finditer), which detection needs to locate every match.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scanner [--size-mb 4] [--repeat 5] [file.pdf ...]
+"""
+import argparse
+import random
+import re
+import time
+import fitz  # PyMuPDF
+from services.scanner import PATTERNS, ScanMatch, scan_text
+
+def synthetic_text(size: int, seed: int = 42) -> str:
+    """
+    Statement-like text: dates, amounts, references and a sprinkling of PII
+    """
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        kind = rng.random()
+        if kind < 0.6:
+            line = (f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024  UPI/{rng.randint(10**11, 10**12 - 1)}/"
+                    f"PAYMENT TO MERCHANT {rng.randint(1, 999)}  {rng.randint(1, 99999)}.{rng.randint(0, 99):02d}  "
+                    f"{rng.randint(1, 999999)}.{rng.randint(0, 99):02d}")
+        elif kind < 0.8:
+            line = "Opening balance carried forward from previous statement period, branch ref " + str(rng.randint(1000, 9999))
+        elif kind < 0.9:
+            line = (f"Account No: {rng.randint(10**10, 10**12)}  IFSC SBIN000{rng.randint(1000, 9999)}  "
+                    f"Phone +91 {rng.randint(6, 9)}{rng.randint(10**8, 10**9 - 1)}")
+        else:
+            line = (f"Card {rng.randint(4000, 4999)} {rng.randint(1000, 9999)} {rng.randint(1000, 9999)} "
+                    f"{rng.randint(1000, 9999)}  PAN ABCDE{rng.randint(1000, 9999)}F  user{rng.randint(1, 99)}@example.com")
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+def pdf_text(path: str) -> str:
+    with fitz.open(path) as doc:
+        return "\n".join(page.get_text() for page in doc)
+
+def legacy_scan(text: str) -> dict:
+    """The previous detection loop: one re.findall per pattern"""
+    return {data_type: re.findall(pattern, text) for data_type, pattern in PATTERNS.items()}
+
+def legacy_scan_offsets(text: str) -> dict:
+    """One re.finditer per pattern, keeping offsets like scan_text()"""
+    return {
+        data_type: [ScanMatch(match.start(), match.end(), match.group(0)) for match in re.finditer(pattern, text)]
+        for data_type, pattern in PATTERNS.items()
+    }
+
+def measure(func, text: str, repeat: int) -> float:
+    """Best-of-N throughput in MB/s"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return len(text.encode()) / (1024 * 1024) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="PDF files to take text from")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="size of the synthetic text")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpora = {"synthetic": synthetic_text(int(args.size_mb * 1024 * 1024))}
+    for path in args.files:
+        corpora[path] = pdf_text(path)
+
+    print(f"{'corpus':<40} {'MB':>8} {'findall MB/s':>14} {'finditer MB/s':>14} {'scanner MB/s':>14} "
+          f"{'vs findall':>11} {'vs finditer':>12}")
+    for name, text in corpora.items():
+        legacy = measure(legacy_scan, text, args.repeat)
+        offsets = measure(legacy_scan_offsets, text, args.repeat)
+        single = measure(scan_text, text, args.repeat)
+        size = len(text.encode()) / (1024 * 1024)
+        print(f"{name[-40:]:<40} {size:>8.2f} {legacy:>14.1f} {offsets:>14.1f} {single:>14.1f} "
+              f"{single / legacy:>10.2f}x {single / offsets:>11.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Synthetic PDF corpus for the pipeline benchmarks, generated locally with
+PyMuPDF so every run (and every commit) measures the same documents.
+
+Run from the backend directory:
+    python -m benchmarks.corpus [--profile quick|full] [--out benchmarks/corpus]
+"""
+import argparse
+import json
+import os
+import random
+import fitz  # PyMuPDF
+from services.validators import luhn_check_digit, verhoeff_check_digit
+
+# Fraction of lines that carry PII
+DENSITIES = {"none": 0.0, "low": 0.05, "high": 0.4}
+
+# (kind, pages, density) per profile. Scanned pages are OCR'd, so the
+# large documents are text or mixed only.
+PROFILES = {
+    "quick": [
+        ("text", 1, "low"),
+        ("text", 10, "high"),
+        ("scanned", 1, "low"),
+        ("mixed", 4, "low"),
+    ],
+    "full": [
+        ("text", 1, "none"),
+        ("text", 1, "low"),
+        ("text", 1, "high"),
+        ("text", 10, "low"),
+        ("text", 100, "low"),
+        ("text", 100, "high"),
+        ("text", 1000, "low"),
+        ("scanned", 1, "low"),
+        ("scanned", 10, "high"),
+        ("mixed", 10, "low"),
+        ("mixed", 100, "low"),
+        ("mixed", 1000, "low"),
+    ],
+}
+
+# Bump when generated documents change, so stale corpora are rebuilt
+CORPUS_VERSION = 3
+LINES_PER_PAGE = 45
+SCAN_DPI = 150
+
+def pii_line(rng: random.Random) -> tuple:
+    """(line, the PII value on it)"""
+    choice = rng.randrange(6)
+    # Aadhaar and card numbers carry valid check digits, as real ones do
+    if choice == 0:
+        digits = f"{rng.randint(2, 9)}{rng.randint(10**9, 10**10 - 1)}"
+        digits += verhoeff_check_digit(digits)
+        value = f"{digits[:4]} {digits[4:8]} {digits[8:]}"
+        return f"Aadhaar: {value}", value
+    if choice == 1:
+        letters = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(5))
+        value = f"{letters}{rng.randint(1000, 9999)}{rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}"
+        return f"PAN: {value}", value
+    if choice == 2:
+        value = f"{rng.randint(6, 9)}{rng.randint(10**8, 10**9 - 1)}"
+        return f"Mobile: +91 {value}", value
+    if choice == 3:
+        value = f"customer{rng.randint(1, 9999)}@example.com"
+        return f"Email: {value}", value
+    if choice == 4:
+        value = str(rng.randint(10**10, 10**12))
+        return f"Account No: {value}  IFSC SBIN000{rng.randint(1000, 9999)}", value
+    digits = f"{rng.randint(4000, 5999)}{rng.randint(10**10, 10**11 - 1)}"
+    digits += luhn_check_digit(digits)
+    value = f"{digits[:4]} {digits[4:8]} {digits[8:12]} {digits[12:]}"
+    return f"Card: {value}", value
+
+def filler_line(rng: random.Random) -> str:
+    if rng.random() < 0.6:
+        return (f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024  PAYMENT TO MERCHANT {rng.randint(1, 999)}"
+                f"  {rng.randint(1, 99999)}.{rng.randint(0, 99):02d}")
+    return f"Balance carried forward from the previous period, ref {rng.randint(1000, 9999)}"
+
+def page_lines(rng: random.Random, density: float) -> tuple:
+    """(lines of one page, the PII values on them)"""
+    lines = []
+    values = []
+    for _ in range(LINES_PER_PAGE):
+        if rng.random() < density:
+            line, value = pii_line(rng)
+            lines.append(line)
+            values.append(value)
+        else:
+            lines.append(filler_line(rng))
+    return lines, values
+
+def write_text_page(doc, lines: list):
+    page = doc.new_page()
+    page.insert_text((50, 50), "\n".join(lines), fontsize=9)
+
+def write_scanned_page(doc, lines: list):
+    """A page that is only an image of text, as a scanner would produce"""
+    with fitz.open() as scratch:
+        write_text_page(scratch, lines)
+        pix = scratch[0].get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY)
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+
+def document_name(kind: str, pages: int, density: str) -> str:
+    return f"{kind}_{pages}p_{density}.pdf"
+
+def generate_document(path: str, kind: str, pages: int, density: str, seed: int) -> dict:
+    rng = random.Random(f"{seed}:{kind}:{pages}:{density}")
+    pii_values = []
+    with fitz.open() as doc:
+        for page_number in range(pages):
+            lines, values = page_lines(rng, DENSITIES[density])
+            pii_values.extend(values)
+            # Mixed documents alternate text and scanned pages
+            if kind == "scanned" or (kind == "mixed" and page_number % 2 == 1):
+                write_scanned_page(doc, lines)
+            else:
+                write_text_page(doc, lines)
+        doc.save(path, garbage=3, deflate=True)
+    return {
+        "file": os.path.basename(path),
+        "kind": kind,
+        "pages": pages,
+        "density": density,
+        "pii_lines": len(pii_values),
+        # Ground truth for measuring detection recall
+        "pii_values": sorted(set(pii_values)),
+        "size": os.path.getsize(path)
+    }
+
+def generate_corpus(out_dir: str, profile: str = "quick", seed: int = 42) -> list:
+    """
+    Write the profile's documents (reusing ones already generated with the
+    same seed) and a manifest.json describing them
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    known = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        if previous.get("seed") == seed and previous.get("version") == CORPUS_VERSION:
+            known = {entry["file"]: entry for entry in previous["documents"]}
+
+    documents = []
+    for kind, pages, density in PROFILES[profile]:
+        name = document_name(kind, pages, density)
+        path = os.path.join(out_dir, name)
+        if name in known and os.path.exists(path):
+            documents.append(known[name])
+        else:
+            documents.append(generate_document(path, kind, pages, density, seed))
+
+    all_documents = dict(known)
+    all_documents.update((entry["file"], entry) for entry in documents)
+    with open(manifest_path, "w") as f:
+        json.dump({"version": CORPUS_VERSION, "seed": seed, "documents": list(all_documents.values())}, f, indent=2)
+    return documents
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--out", default=os.path.join("benchmarks", "corpus"))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for entry in generate_corpus(args.out, args.profile, args.seed):
+        print(f"{entry['file']:<28} {entry['pages']:>5} pages {entry['size'] / 1024:>10.1f} KB")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
 # Import routers
-from routers import upload, detect, redact, download, verify
+from routers import upload, detect, redact, download, verify, jobs, batch, admin
+from services import metrics, ocr, ocr_engine
+from services.jobs import job_manager
+from services.storage import content_store
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ocr_engine.check_engine()
+    # Expire and evict stored files periodically
+    content_store.start_gc()
+    yield
+    # Stop queued jobs, then background worker processes
+    content_store.stop_gc()
+    job_manager.shutdown()
+    batch.shutdown_batch_pool()
+    ocr.shutdown_ocr_pool()
 
 # Create FastAPI app
 app = FastAPI(
     title="PDF Redaction API",
     description="Backend for PDF-Redaction Roulette",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware - THIS IS CRITICAL
@@ -31,12 +49,20 @@ app.include_router(detect.router, prefix="/data", tags=["Detect"])
 app.include_router(redact.router, prefix="/redact", tags=["Redact"])
 app.include_router(download.router, prefix="/download", tags=["Download"])
 app.include_router(verify.router, prefix="/verify", tags=["Verify"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+app.include_router(batch.router, prefix="/batch", tags=["Batch"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
 # Health check endpoint
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # Test endpoint to verify CORS
 @app.get("/test-cors")
 def test_cors():
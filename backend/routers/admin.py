@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from starlette.concurrency import run_in_threadpool
+from services.storage import content_store
+
+router = APIRouter()
+
+@router.get("/storage")
+async def storage_stats():
+    """
+    Space used by the content-addressed store, space saved by sharing
+    identical files, and what the GC has reclaimed
+    """
+    return await run_in_threadpool(content_store.stats)
+
+@router.post("/storage/gc")
+async def run_storage_gc():
+    """
+    Apply the TTL and quota now instead of waiting for the background GC
+    """
+    result = await run_in_threadpool(content_store.gc)
+    return {"success": True, "gc": result, "storage": await run_in_threadpool(content_store.stats)}
+
+@router.post("/storage/migrate")
+async def migrate_legacy_files():
+    """
+    Move files still in uploads/ and redacted/ into the store
+    """
+    migrated = await run_in_threadpool(content_store.migrate_legacy)
+    return {"success": True, "migrated": migrated}
@@ -0,0 +1,361 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse
+from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+import os
+import json
+import time
+import uuid
+import logging
+import zipfile
+import threading
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from routers.detect import detect_sensitive_data_debug, select_detectors
+from routers.redact import RedactionRequest, SAVE_MODES, DEFAULT_SAVE_MODE, redact_file
+from routers.upload import MAX_UPLOAD_SIZE, sniff_pdf
+from routers.download import stored_file_response
+from services.detectors import registry
+from services.jobs import Job
+from routers.jobs import submit_job
+from services.storage import content_store
+
+router = APIRouter()
+
+# Documents processed in parallel; each worker keeps its compiled patterns
+# and shares the on-disk detection and OCR caches with the others
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+# Total size of the PDFs in one batch, after unzipping
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(1024 * 1024 * 1024)))
+COPY_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_batch_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the shared batch process pool, or None to process documents inline
+    """
+    global _pool
+
+    if BATCH_WORKERS <= 1:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            # Spawn instead of fork: the API process runs threads
+            _pool = ProcessPoolExecutor(
+                max_workers=BATCH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Started batch pool with {BATCH_WORKERS} workers")
+        return _pool
+
+def shutdown_batch_pool():
+    """Stop the batch worker processes"""
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def copy_to_temp(source, limit: int) -> Optional[str]:
+    """
+    Copy a file object to a temporary path in chunks. Returns the path, or
+    None (leaving nothing behind) once more than limit bytes were read.
+    """
+    path = content_store.temp_path(".pdf")
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = source.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                return path
+            size += len(chunk)
+            if size > limit:
+                break
+            f.write(chunk)
+    os.remove(path)
+    return None
+
+def read_batch_document(filename: str, size: int, open_source) -> dict:
+    """
+    {"filename", "path"} with the document copied to a temporary file, or
+    {"filename", "error"}. open_source() returns a context manager for
+    the document's file object.
+    """
+    size_error = {"filename": filename, "error": "File size exceeds 10MB limit"}
+    if size > MAX_UPLOAD_SIZE:
+        return size_error
+    with open_source() as source:
+        # Never trust a zip entry's stated size further than the limit
+        path = copy_to_temp(source, MAX_UPLOAD_SIZE)
+    if path is None:
+        return size_error
+    return {"filename": filename, "path": path}
+
+def check_batch_limits(count: int, total_size: int):
+    if count > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"A batch may hold at most {BATCH_MAX_FILES} documents")
+    if total_size > BATCH_MAX_BYTES:
+        raise HTTPException(status_code=413,
+                            detail=f"A batch may hold at most {BATCH_MAX_BYTES // (1024 * 1024)}MB of PDFs")
+
+def read_batch_documents(files: List[UploadFile]) -> list:
+    """
+    Expand the uploaded files (PDFs and zip archives of PDFs) into
+    [{"filename", "path"} or {"filename", "error"}, ...], copying each
+    PDF to a temporary file rather than into memory. The document count
+    and total size are checked before each document is read, from the zip
+    directory for archive entries, so an oversized batch is refused
+    without unpacking it.
+    """
+    documents = []
+    total_size = 0
+    try:
+        for upload in files:
+            if zipfile.is_zipfile(upload.file):
+                upload.file.seek(0)
+                with zipfile.ZipFile(upload.file) as archive:
+                    for entry in archive.infolist():
+                        if entry.is_dir() or not entry.filename.lower().endswith(".pdf"):
+                            continue
+                        if entry.file_size <= MAX_UPLOAD_SIZE:
+                            total_size += entry.file_size
+                        check_batch_limits(len(documents) + 1, total_size)
+                        documents.append(read_batch_document(
+                            entry.filename, entry.file_size, lambda: archive.open(entry)
+                        ))
+            else:
+                size = upload.file.seek(0, os.SEEK_END)
+                upload.file.seek(0)
+                if size <= MAX_UPLOAD_SIZE:
+                    total_size += size
+                check_batch_limits(len(documents) + 1, total_size)
+                documents.append(read_batch_document(upload.filename, size, lambda: nullcontext(upload.file)))
+    except BaseException:
+        for document in documents:
+            if "path" in document:
+                os.remove(document["path"])
+        raise
+    return documents
+
+def save_batch_documents(documents: list) -> list:
+    """
+    Store each readable PDF as a regular upload so it gets a file_id;
+    repeated content is stored once. Its temporary copy is moved into the
+    store or removed.
+    """
+    for document in documents:
+        path = document.pop("path", None)
+        if path is None:
+            continue
+        with open(path, "rb") as f:
+            reason = sniff_pdf(f.read(2048))
+        if reason is not None:
+            os.remove(path)
+            document["error"] = reason
+            continue
+        document["file_id"] = str(uuid.uuid4())
+        content_store.put_file(document["file_id"], "upload", path)
+    return documents
+
+def process_document(file_id: str, options: dict) -> dict:
+    """
+    Worker entry point: detect one uploaded document, with only the
+    detectors options["types"] names if given, and redact what was found
+    """
+    start = time.perf_counter()
+    file_path = content_store.path_for(file_id, "upload")
+
+    detectors = registry.select(options["types"]) if options["types"] else None
+    detection = detect_sensitive_data_debug(file_path, options["use_cache"], detectors=detectors,
+                                            sha256=content_store.sha256_for(file_id, "upload"))
+    result = {
+        "file_id": file_id,
+        "status": detection["status"],
+        "detected_data": detection["detected_data"],
+        "cache_hit": detection.get("cache", {}).get("hit", False),
+    }
+    if detection["status"] not in ("success", "no_text_found"):
+        result["error"] = detection.get("error") or detection["debug_info"].get("error")
+        return result
+
+    if options["redact"]:
+        request = RedactionRequest(items_to_redact=detection["detected_data"], save_mode=options["save_mode"])
+        redaction = redact_file(file_id, file_path, request, SAVE_MODES[options["save_mode"]])
+        result["redacted_count"] = redaction["redacted_count"]
+        result["output_size"] = redaction["output_size"]
+
+    result["processing_time"] = round(time.perf_counter() - start, 4)
+    return result
+
+def run_batch(batch_id: str, documents: list, options: dict, job: Optional[Job] = None) -> dict:
+    """
+    Process every document, in parallel when a pool is available, then
+    write the summary and a zip of the redacted PDFs. A failing document
+    is reported in its entry and does not stop the others.
+    """
+    start = time.perf_counter()
+    pending = [document for document in documents if "file_id" in document]
+    pool = get_batch_pool()
+    done = 0
+
+    def finish(document: dict, outcome: dict = None, error: str = None):
+        nonlocal done
+        done += 1
+        if outcome is not None:
+            document.update(outcome)
+        if error is not None:
+            document["error"] = error
+        if job is not None:
+            job.progress = {"documents_done": done, "document_count": len(pending)}
+
+    if pool is None:
+        for document in pending:
+            if job is not None:
+                job.check_cancelled()
+            try:
+                finish(document, process_document(document["file_id"], options))
+            except Exception as e:
+                finish(document, error=str(e))
+    else:
+        futures = {pool.submit(process_document, document["file_id"], options): document for document in pending}
+        try:
+            for future in as_completed(futures):
+                document = futures[future]
+                try:
+                    finish(document, future.result())
+                except BrokenProcessPool:
+                    # A worker died; the pool cannot be reused
+                    shutdown_batch_pool()
+                    finish(document, error="Batch worker crashed")
+                except Exception as e:
+                    finish(document, error=str(e))
+                if job is not None:
+                    job.check_cancelled()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    summary = {
+        "batch_id": batch_id,
+        "document_count": len(documents),
+        "succeeded": sum(1 for document in documents if "file_id" in document and "error" not in document),
+        "failed": sum(1 for document in documents if "error" in document),
+        "total_detected": sum(
+            len(values) for document in documents for values in document.get("detected_data", {}).values()
+        ),
+        "total_redacted": sum(document.get("redacted_count", 0) for document in documents),
+        "processing_time": round(time.perf_counter() - start, 4),
+        "workers": BATCH_WORKERS if pool is not None else 1,
+        "download_url": f"/batch/{batch_id}/download" if options["redact"] else None,
+        "documents": documents
+    }
+
+    if options["redact"]:
+        write_batch_archive(batch_id, summary)
+    content_store.put_bytes(batch_id, "batch_summary", json.dumps(summary, indent=2).encode())
+
+    logger.info(f"Batch {batch_id}: {summary['succeeded']} succeeded, {summary['failed']} failed "
+                f"in {summary['processing_time']}s")
+    return summary
+
+def write_batch_archive(batch_id: str, summary: dict):
+    """Zip the redacted PDFs under their original names, plus the summary"""
+    used_names = set()
+    archive_path = content_store.temp_path(".zip")
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for document in summary["documents"]:
+            if "error" in document:
+                continue
+            output_path = content_store.path_for(document["file_id"], "redacted")
+            if output_path is None:
+                continue
+            base, ext = os.path.splitext(os.path.basename(document["filename"] or "document.pdf"))
+            name = f"{base}_redacted{ext or '.pdf'}"
+            counter = 1
+            while name in used_names:
+                counter += 1
+                name = f"{base}_redacted_{counter}{ext or '.pdf'}"
+            used_names.add(name)
+            archive.write(output_path, name)
+        archive.writestr("summary.json", json.dumps(summary, indent=2))
+    content_store.put_file(batch_id, "batch_archive", archive_path)
+
+def batch_job(job: Job, batch_id: str, documents: list, options: dict) -> dict:
+    return run_batch(batch_id, documents, options, job)
+
+@router.post("/")
+async def process_batch(
+    files: List[UploadFile] = File(...),
+    redact: bool = True,
+    types: Optional[str] = None,
+    save_mode: str = DEFAULT_SAVE_MODE,
+    use_cache: bool = True,
+    background: bool = False
+):
+    """
+    Upload, detect and redact many PDFs in one call. Accepts several PDFs
+    and/or zip archives of PDFs; types is an optional comma separated list
+    of detectors to run (default: all of them, see /data/detectors).
+    """
+    if save_mode not in SAVE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown save_mode '{save_mode}'")
+    detectors = select_detectors([types] if types else None)
+
+    options = {
+        "redact": redact,
+        # Names rather than detectors: options go to the worker processes
+        "types": [detector.name for detector in detectors] if detectors else None,
+        "save_mode": save_mode,
+        "use_cache": use_cache
+    }
+
+    documents = await run_in_threadpool(read_batch_documents, files)
+    if not documents:
+        raise HTTPException(status_code=400, detail="No PDF files found in the request")
+    documents = await run_in_threadpool(save_batch_documents, documents)
+
+    batch_id = str(uuid.uuid4())
+    logger.info(f"Batch {batch_id}: {len(documents)} documents")
+
+    if background:
+        return JSONResponse(submit_job("batch", batch_job, {"batch_id": batch_id, "documents": len(documents)},
+                                       batch_id, documents, options, batch_id=batch_id),
+                            status_code=202)
+
+    try:
+        summary = await run_in_threadpool(run_batch, batch_id, documents, options)
+    except Exception as e:
+        logger.error(f"Batch {batch_id} failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
+    return dict(summary, success=True)
+
+@router.get("/{batch_id}")
+async def get_batch(batch_id: str):
+    """
+    Aggregate result of a finished batch
+    """
+    summary = await run_in_threadpool(content_store.read_bytes, batch_id, "batch_summary")
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return json.loads(summary)
+
+@router.get("/{batch_id}/download")
+async def download_batch(batch_id: str, request: Request):
+    """
+    Zip of the batch's redacted PDFs and its summary
+    """
+    response = await run_in_threadpool(
+        stored_file_response, request, batch_id, "batch_archive", "application/zip", f"redacted_batch_{batch_id}.zip"
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail="Batch archive not found")
+    return response
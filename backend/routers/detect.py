@@ -1,61 +1,259 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
-import re
+import json
 import fitz  # PyMuPDF
 import logging
-import pytesseract
-from PIL import Image
-import io
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional
+from starlette.concurrency import run_in_threadpool
+from services import metrics, ocr, ocr_engine
+from services.scanner import DETECTOR_VERSION, scan_text
+from services.detectors import UnknownDetector, registry
+from services.layout import PageLayout
+from services.validators import CHECKSUMS, validate_matches
+from services.classifier import OcrDecision, classify_page
+from services.analysis import Analysis, AnalysisWriter, PageRecord, analysis_exists, save_analysis
+from services.cache import DetectionCache, detection_cache, file_sha256, ocr_page_cache
+from services.jobs import Job
+from routers.jobs import submit_job
+from services.storage import content_store
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
+# Characters of the previous page carried into the next page's scan, so
+# matches spanning a page break are still found
+PAGE_OVERLAP_CHARS = 256
+# Hard cap when widening the overlap to a whitespace boundary
+MAX_PAGE_OVERLAP_CHARS = 4096
+# Characters on either side of a match that validators may look at
+CONTEXT_CHARS = 50
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@dataclass
+class PageExtraction:
+    """
+    Result of extracting a single PDF page in one pass
+    """
+    page_number: int
+    raw_text: str = ""
+    ocr_text: str = ""
+    ocr_used: bool = False
+    extraction_time: float = 0.0
+    ocr_time: float = 0.0
+    error: Optional[str] = None
+    layout: Optional[PageLayout] = None
+    ocr_layout: Optional[PageLayout] = None
+    ocr_decision: Optional[OcrDecision] = None
+
+    @property
+    def text(self) -> str:
+        """Combined page text: the text layer plus any OCR output"""
+        if self.ocr_used:
+            text = self.raw_text + "\n" + self.ocr_text if self.raw_text else self.ocr_text
+        else:
+            text = self.raw_text
+        return text.strip()
+
+    def layouts(self) -> list:
+        """(offset in text, layout) for the text layer and the OCR'd words"""
+        layouts = []
+        if self.raw_text and self.layout is not None:
+            layouts.append((0, self.layout))
+        if self.ocr_used and self.ocr_layout is not None:
+            layouts.append((len(self.raw_text) + 1 if self.raw_text else 0, self.ocr_layout))
+        return layouts
+
+@dataclass
+class Finding:
+    """
+    A validated hit: its normalized value and where it was found.
+    start/end are offsets into the document text; page_start/page_end
+    are offsets into the text of its page.
+    """
+    data_type: str
+    value: str
+    text: str
+    start: int
+    end: int
+    page: int = 0
+    page_start: int = 0
+    page_end: int = 0
+    rects: list = field(default_factory=list)
+
+    @classmethod
+    def from_match(cls, data_type: str, value: str, match, page_offsets: Optional[list] = None,
+                   offset: int = 0):
+        finding = cls(data_type, value, match.text, match.start + offset, match.end + offset)
+        if page_offsets:
+            # page_offsets holds [offset of page text in document text, page number]
+            index = bisect_right(page_offsets, [finding.start, float("inf")]) - 1
+            page_offset, finding.page = page_offsets[max(index, 0)]
+            finding.page_start = finding.start - page_offset
+            finding.page_end = finding.end - page_offset
+        return finding
+
+    def to_dict(self) -> dict:
+        return {
+            "value": self.value,
+            "text": self.text,
+            "page": self.page,
+            "start": self.page_start,
+            "end": self.page_end,
+            "rects": self.rects
+        }
+
+def apply_ocr_text(extraction: PageExtraction, ocr_words: list, seconds: float):
+    """
+    Record OCR output (words in page coordinates) on a page extraction if
+    it is substantial enough
+    """
+    extraction.ocr_time = seconds
+    metrics.OCR_PAGE_SECONDS.observe(seconds)
+    ocr_layout = PageLayout(ocr_words)
+    ocr_text = ocr_layout.text
+    if len(ocr_text.strip()) > 10:
+        logger.info(f"OCR extracted {len(ocr_text)} characters")
+        extraction.ocr_text = ocr_text
+        extraction.ocr_layout = ocr_layout
+        extraction.ocr_used = True
+        metrics.OCR_FALLBACKS.inc(outcome="used")
+    else:
+        metrics.OCR_FALLBACKS.inc(outcome="empty")
+
+def extract_page_text(page, page_number: int = 0, run_ocr: bool = True) -> PageExtraction:
+    """
+    Extract text from a PDF page, using OCR if little or no text is found.
+    The text layer is parsed exactly once per page, and the page classifier
+    decides from image and text geometry whether (and where) OCR is needed.
+    With run_ocr=False the caller is responsible for OCR (see
+    iter_page_extractions).
+    """
+    result = PageExtraction(page_number=page_number)
+
+    start = time.perf_counter()
+    # Positioned words give both the text and where each hit sits on the page
+    result.layout = PageLayout(page.get_text("words"))
+    result.raw_text = result.layout.text
+    result.extraction_time = time.perf_counter() - start
+    metrics.PAGE_EXTRACTION_SECONDS.observe(result.extraction_time)
+    result.ocr_decision = classify_page(page, result.layout.words)
+
+    # OCR only the image regions that have no text layer
+    if run_ocr and result.ocr_decision.needs_ocr:
+        logger.info(f"Page {page_number}: {result.ocr_decision.reason}, attempting OCR...")
+        start = time.perf_counter()
+        try:
+            ocr_words = ocr.ocr_page(page, has_text=bool(result.raw_text.strip()),
+                                     regions=result.ocr_decision.regions)
+            apply_ocr_text(result, ocr_words, time.perf_counter() - start)
+        except Exception as e:
+            # Keep the text layer we already have
+            logger.error(f"OCR extraction failed: {e}")
+            metrics.OCR_FALLBACKS.inc(outcome="error")
+            result.error = str(e)
+            result.ocr_time = time.perf_counter() - start
+
+    return result
+
 def extract_text_with_ocr(page):
     """
     Extract text from a PDF page using OCR if no text is found
     """
+    return extract_page_text(page).text
+
+def finish_ocr(extraction: PageExtraction, future, pool: Optional[ocr.OcrPool] = None,
+               args: tuple = ()) -> PageExtraction:
+    """
+    Wait for a page's pooled OCR job (if any) and record its result. If a
+    worker crashed, the pool is restarted and the page is tried once more.
+    """
+    if future is None:
+        return extraction
     try:
-        # First try to extract text directly
-        text = page.get_text()
-        
-        # If little or no text found, try OCR
-        if not text or len(text.strip()) < 50:
-            logger.info(f"Little text found ({len(text)} chars), attempting OCR...")
-            
-            # Get the page as an image
-            mat = fitz.Matrix(2, 2)  # Zoom factor for better quality
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL Image
-            img_data = pix.tobytes("ppm")
-            img = Image.open(io.BytesIO(img_data))
+        try:
+            ocr_words, seconds = future.result(timeout=ocr.OCR_PAGE_TIMEOUT)
+        except BrokenProcessPool as e:
+            if pool is None:
+                raise
+            logger.warning(f"OCR worker crashed on page {extraction.page_number}, retrying")
+            pool.restart(future.pool_generation, str(e) or "worker crashed")
+            future = pool.submit(ocr.ocr_document_page, *args)
+            ocr_words, seconds = future.result(timeout=ocr.OCR_PAGE_TIMEOUT)
+        apply_ocr_text(extraction, ocr_words, seconds)
+    except FuturesTimeoutError:
+        future.cancel()
+        logger.error(f"OCR timed out on page {extraction.page_number}")
+        metrics.OCR_FALLBACKS.inc(outcome="error")
+        extraction.error = f"OCR timed out after {ocr.OCR_PAGE_TIMEOUT}s"
+    except BrokenProcessPool:
+        logger.error(f"OCR worker crashed twice on page {extraction.page_number}")
+        pool.restart(future.pool_generation, "worker crashed on retry")
+        metrics.OCR_FALLBACKS.inc(outcome="error")
+        extraction.error = "OCR worker crashed"
+    except Exception as e:
+        logger.error(f"OCR failed on page {extraction.page_number}: {e}")
+        metrics.OCR_FALLBACKS.inc(outcome="error")
+        extraction.error = str(e)
+    return extraction
+
+def iter_page_extractions(doc, file_path: str) -> Iterator[PageExtraction]:
+    """
+    Yield one PageExtraction per page, in page order.
+    Pages the classifier sends to OCR are OCR'd in the worker pool (each
+    worker opens the document itself) at most a few pages ahead of the
+    consumer, so only a bounded number of pages are ever held in memory.
+    """
+    pool = ocr.get_ocr_pool()
+    lookahead = max(1, ocr.OCR_WORKERS * 2)
+    pending = deque()
+    
+    try:
+        for page_num in range(len(doc)):
+            try:
+                extraction = extract_page_text(doc[page_num], page_num + 1, run_ocr=pool is None)
+            except Exception as page_error:
+                logger.error(f"Error on page {page_num}: {page_error}")
+                extraction = PageExtraction(page_number=page_num + 1, error=str(page_error))
             
-            # Perform OCR
-            ocr_text = pytesseract.image_to_string(img, lang='eng')
+            future = None
+            args = ()
+            if pool is not None and extraction.error is None and extraction.ocr_decision.needs_ocr:
+                args = (file_path, page_num, bool(extraction.raw_text.strip()), extraction.ocr_decision.regions)
+                try:
+                    future = pool.submit(ocr.ocr_document_page, *args)
+                except Exception as e:
+                    logger.error(f"Could not queue OCR for page {page_num + 1}: {e}")
+                    metrics.OCR_FALLBACKS.inc(outcome="error")
+                    extraction.error = str(e)
+            pending.append((extraction, future, pool, args))
             
-            if ocr_text and len(ocr_text.strip()) > 10:
-                logger.info(f"OCR extracted {len(ocr_text)} characters")
-                text += "\n" + ocr_text if text else ocr_text
-        
-        return text.strip()
+            # Hand back finished pages in order; only block when too far ahead
+            while pending and (len(pending) > lookahead or pending[0][1] is None or pending[0][1].done()):
+                yield finish_ocr(*pending.popleft())
         
-    except Exception as e:
-        logger.error(f"OCR extraction failed: {e}")
-        return page.get_text()  # Fallback to regular text extraction
+        while pending:
+            yield finish_ocr(*pending.popleft())
+    finally:
+        # The consumer stopped early: drop OCR work nobody will read
+        for _, future, _, _ in pending:
+            if future is not None:
+                future.cancel()
 
-def extract_text_with_debug(file_path: str) -> dict:
+def new_debug_info(file_path: str) -> dict:
     """
-    Extract text with detailed debugging information including OCR
+    Empty extraction statistics for a document
     """
-    debug_info = {
+    return {
         "file_path": file_path,
         "file_exists": os.path.exists(file_path),
-        "text_content": "",
         "page_count": 0,
         "characters_per_page": [],
         "total_characters": 0,
@@ -63,268 +261,232 @@ def extract_text_with_debug(file_path: str) -> dict:
         "ocr_pages": [],
         "error": None
     }
-    
-    try:
-        if not debug_info["file_exists"]:
-            debug_info["error"] = "File does not exist"
-            return debug_info
-        
-        doc = fitz.open(file_path)
-        debug_info["page_count"] = len(doc)
-        
-        full_text = ""
-        for page_num in range(len(doc)):
-            try:
-                page = doc[page_num]
-                
-                # Extract text with OCR fallback
-                page_text = extract_text_with_ocr(page)
-                char_count = len(page_text)
-                
-                # Check if OCR was used (heuristic: if original text was short but OCR found more)
-                original_text = page.get_text()
-                ocr_used = len(original_text.strip()) < 50 and char_count > len(original_text) + 20
-                
-                if ocr_used:
-                    debug_info["ocr_used"] = True
-                    debug_info["ocr_pages"].append(page_num + 1)
-                
-                debug_info["characters_per_page"].append({
-                    "page": page_num + 1,
-                    "characters": char_count,
-                    "original_characters": len(original_text),
-                    "ocr_used": ocr_used,
-                    "preview": page_text[:100] + "..." if char_count > 100 else page_text
-                })
-                
-                full_text += page_text + "\n"
-                logger.info(f"Page {page_num + 1}: {char_count} characters (OCR: {ocr_used})")
-                
-            except Exception as page_error:
-                logger.error(f"Error on page {page_num}: {page_error}")
-                debug_info["characters_per_page"].append({
-                    "page": page_num + 1,
-                    "characters": 0,
-                    "error": str(page_error)
-                })
-        
-        doc.close()
-        
-        debug_info["text_content"] = full_text
-        debug_info["total_characters"] = len(full_text)
-        
-        logger.info(f"Extraction complete: {debug_info['total_characters']} total characters, OCR used: {debug_info['ocr_used']}")
-        
-    except Exception as e:
-        debug_info["error"] = str(e)
-        logger.error(f"Extraction failed: {e}")
-    
-    return debug_info
 
-def is_likely_bank_account(text: str, context: str = "") -> bool:
+def record_page(debug_info: dict, extraction: PageExtraction):
     """
-    Determine if a numeric string is likely a bank account number
+    Add one page's statistics to debug_info. Only a short preview of the
+    page text is kept.
     """
-    # Remove spaces and common separators
-    clean_text = re.sub(r'[\s\-]', '', text)
-    
-    # Must be all digits and within typical bank account length
-    if not clean_text.isdigit() or not (9 <= len(clean_text) <= 18):
-        return False
-    
-    # Check for common bank account patterns
-    bank_patterns = [
-        r'.*account.*', r'.*a/c.*', r'.*acc.*', r'.*bank.*', 
-        r'.*savings.*', r'.*current.*', r'.*account\s*no.*',
-        r'.*account\s*number.*', r'.*a\/c\s*no.*', r'.*acc\s*no.*'
-    ]
+    page_text = extraction.text
+    char_count = len(page_text)
     
-    # Check context for bank-related keywords
-    context_lower = context.lower()
-    for pattern in bank_patterns:
-        if re.search(pattern, context_lower, re.IGNORECASE):
-            return True
+    if extraction.ocr_used:
+        debug_info["ocr_used"] = True
+        debug_info["ocr_pages"].append(extraction.page_number)
     
-    # Check for common bank prefixes (Indian banks)
-    bank_prefixes = ['0', '1', '2', '3', '4', '5', '6']  # Common starting digits
-    if clean_text[0] in bank_prefixes:
-        return True
-    
-    # Check if it's near other banking terms in the text
-    banking_terms = ['ifsc', 'branch', 'bank', 'account', 'savings', 'current', 'overdraft']
-    if any(term in context_lower for term in banking_terms):
-        return True
+    page_info = {
+        "page": extraction.page_number,
+        "characters": char_count,
+        "original_characters": len(extraction.raw_text),
+        "ocr_used": extraction.ocr_used,
+        "extraction_time_ms": round(extraction.extraction_time * 1000, 2),
+        "ocr_time_ms": round(extraction.ocr_time * 1000, 2),
+        "preview": page_text[:100] + "..." if char_count > 100 else page_text
+    }
+    if extraction.ocr_decision is not None:
+        # Why the page was (or was not) OCR'd
+        page_info["ocr_decision"] = extraction.ocr_decision.to_dict()
+    if extraction.error:
+        page_info["error"] = extraction.error
+    debug_info["characters_per_page"].append(page_info)
     
-    return False
+    # Pages are joined with a newline, as if into one document text
+    debug_info["total_characters"] += char_count + 1
+    logger.info(f"Page {extraction.page_number}: {char_count} characters (OCR: {extraction.ocr_used})")
 
-def is_likely_phone_number(text: str) -> bool:
+def page_overlap(window: str) -> str:
     """
-    Determine if a numeric string is likely a phone number
+    The tail of a scan window to carry into the next page's scan, cut just
+    after whitespace so no token is split
     """
-    clean_text = re.sub(r'[\-\s+]', '', text)
-    
-    # Indian phone numbers start with 6,7,8,9 and are 10 digits
-    if len(clean_text) == 10 and clean_text.isdigit() and clean_text[0] in '6789':
-        return True
-    
-    # With country code
-    if len(clean_text) == 12 and clean_text.startswith('91') and clean_text[2] in '6789':
-        return True
-    
-    return False
+    start = max(0, len(window) - PAGE_OVERLAP_CHARS)
+    limit = max(0, len(window) - MAX_PAGE_OVERLAP_CHARS)
+    while start > limit and not window[start - 1].isspace():
+        start -= 1
+    return window[start:]
 
-def is_likely_aadhaar(text: str) -> bool:
+def locate_span(start: int, end: int, layouts: Iterable) -> list:
     """
-    Determine if a numeric string is likely an Aadhaar number
+    Rectangles ([page, x0, y0, x1, y1]) covering document text[start:end],
+    which may run across pages. layouts holds (doc offset, page number,
+    [(offset in page text, layout), ...]); OCR'd text is located through
+    the word boxes Tesseract reported.
     """
-    clean_text = re.sub(r'\s', '', text)
-    
-    # Aadhaar is exactly 12 digits and doesn't start with 0 or 1
-    if len(clean_text) == 12 and clean_text.isdigit() and not clean_text.startswith(('0', '1')):
-        return True
-    
-    return False
+    rects = []
+    for page_offset, page_number, page_layouts in layouts:
+        for offset, layout in page_layouts:
+            layout_start = page_offset + offset
+            if start >= layout_start + len(layout.text) or end <= layout_start:
+                continue
+            for rect in layout.rects_for(start - layout_start, end - layout_start):
+                rects.append([page_number] + rect)
+    return rects
 
-def is_likely_pan(text: str) -> bool:
+def iter_page_findings(extractions: Iterable[PageExtraction], debug_info: dict,
+                       pattern_stats: dict, detectors: tuple) -> Iterator[tuple]:
     """
-    Determine if a string is likely a PAN number
+    Streaming detection: scan each page as it arrives, together with a
+    small overlap from the previous page so matches spanning a page break
+    are still caught. Yields (extraction, findings) per page. Only the
+    selected detectors are scanned for.
+    
+    A match is only validated once the CONTEXT_CHARS after it are known, so
+    matches close to the end of a page are reported with the next page.
     """
-    # PAN format: 5 letters, 4 digits, 1 letter
-    if len(text) == 10 and re.match(r'^[A-Z]{5}\d{4}[A-Z]$', text):
-        return True
+    tail = ""
+    doc_offset = 0  # where the next page's text starts in the document text
+    reported_until = 0  # matches ending at or before this offset have been handled
+    page_offsets = deque()
+    layouts = deque()  # (doc offset, page number, page layouts) for pages in the window
     
-    return False
+    for extraction in extractions:
+        record_page(debug_info, extraction)
+        page_text = extraction.text
+        
+        window_start = doc_offset - len(tail)
+        page_offsets.append([doc_offset, extraction.page_number])
+        layouts.append((doc_offset, extraction.page_number, extraction.layouts()))
+        while len(page_offsets) > 1 and page_offsets[1][0] <= window_start:
+            page_offsets.popleft()
+            layouts.popleft()
+        
+        window = tail + page_text + "\n"
+        if extraction.page_number >= debug_info["page_count"]:
+            settled_until = window_start + len(window)
+        else:
+            settled_until = window_start + len(window) - CONTEXT_CHARS
+        
+        with metrics.DETECTION_SCAN_SECONDS.time():
+            scanned = scan_text(window, detectors)
+        findings = []
+        for detector in detectors:
+            data_type = detector.name
+            validation_start = time.perf_counter()
+            try:
+                matches = [
+                    m for m in scanned.get(data_type, [])
+                    if reported_until < window_start + m.end <= settled_until
+                ]
+                type_findings = validate_and_categorize_matches(
+                    window, matches, detector, list(page_offsets), window_start
+                )
+                for finding in type_findings:
+                    finding.rects = locate_span(finding.start, finding.end, layouts)
+                findings.extend(type_findings)
+                pattern_stats[data_type]["raw_matches"] += len(matches)
+            except Exception as pattern_error:
+                pattern_stats[data_type]["error"] = str(pattern_error)
+                logger.error(f"Pattern error for {data_type}: {pattern_error}")
+            metrics.DETECTION_VALIDATION_SECONDS.observe(time.perf_counter() - validation_start, data_type=data_type)
+        
+        reported_until = max(reported_until, settled_until)
+        tail = page_overlap(window)
+        doc_offset += len(page_text) + 1
+        yield extraction, findings
 
-def is_likely_credit_card(text: str) -> bool:
+def validate_and_categorize_matches(text: str, pattern_matches: list, detector,
+                                    page_offsets: Optional[list] = None, offset: int = 0) -> list:
     """
-    Determine if a numeric string is likely a credit card
+    Validate matches and categorize them properly.
+    Takes scanner matches (with offsets into text) and returns one Finding per
+    valid occurrence, located on its page when page_offsets is given.
+    offset is where text starts within the document text.
     """
-    clean_text = re.sub(r'[\s\-]', '', text)
-    
-    # Credit cards are exactly 16 digits
-    if len(clean_text) == 16 and clean_text.isdigit():
-        # Check common credit card prefixes
-        prefixes = ['4', '5', '6']  # Visa, Mastercard, Discover
-        if clean_text[0] in prefixes:
-            return True
-    
-    return False
+    # Keyword checks look at CONTEXT_CHARS around each match
+    return [
+        Finding.from_match(detector.name, value, match, page_offsets, offset)
+        for match, value in validate_matches(text, pattern_matches, detector, CONTEXT_CHARS)
+    ]
 
-def validate_and_categorize_matches(text: str, pattern_matches: list, pattern_type: str) -> list:
+def group_findings(findings: list) -> tuple:
     """
-    Validate matches and categorize them properly
+    Split findings into the unique values per type (in order of first
+    appearance) and the list of every location they were found at
     """
-    valid_matches = []
-    
-    for match in pattern_matches:
-        if isinstance(match, tuple):
-            match = ''.join(match)
-        
-        clean_match = re.sub(r'[\s\-]', '', str(match))
-        
-        # Get context around the match (50 characters before and after)
-        match_start = text.find(str(match))
-        if match_start != -1:
-            context_start = max(0, match_start - 50)
-            context_end = min(len(text), match_start + len(str(match)) + 50)
-            context = text[context_start:context_end]
-        else:
-            context = ""
-        
-        if pattern_type == "Aadhaar":
-            if is_likely_aadhaar(match):
-                valid_matches.append(match)
-                
-        elif pattern_type == "PAN":
-            if is_likely_pan(match):
-                valid_matches.append(match.upper())
-                
-        elif pattern_type == "Phone":
-            if is_likely_phone_number(match):
-                # Format phone numbers consistently
-                clean_phone = re.sub(r'[\-\s+]', '', match)
-                if clean_phone.startswith('91') and len(clean_phone) == 12:
-                    clean_phone = clean_phone[2:]  # Remove country code
-                valid_matches.append(clean_phone)
-                
-        elif pattern_type == "Bank_Account":
-            if is_likely_bank_account(match, context):
-                valid_matches.append(clean_match)
-                
-        elif pattern_type == "Credit_Debit_Card":
-            if is_likely_credit_card(match):
-                valid_matches.append(match)
-                
-        elif pattern_type == "Email":
-            # Basic email validation
-            if re.match(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}$', match):
-                valid_matches.append(match.lower())
-    
-    return list(set(valid_matches))  # Remove duplicates
+    detected_data = {}
+    locations = {}
+    for finding in findings:
+        detected_data.setdefault(finding.data_type, {})[finding.value] = None
+        locations.setdefault(finding.data_type, []).append(finding.to_dict())
+    return {k: list(v) for k, v in detected_data.items()}, locations
 
-def detect_sensitive_data_debug(file_path: str) -> dict:
+def new_detection_result(file_path: str, detectors: tuple) -> dict:
     """
-    Detect sensitive data with comprehensive debugging and better categorization
+    Empty detection result for a document
     """
-    result = {
-        "debug_info": extract_text_with_debug(file_path),
+    return {
+        "debug_info": new_debug_info(file_path),
+        "detectors": [detector.name for detector in detectors],
         "detected_data": {},
+        "locations": {},
         "patterns_checked": [],
         "status": "unknown"
     }
+
+def iter_detection(file_path: str, result: dict, detectors: tuple) -> Iterator[tuple]:
+    """
+    Detect sensitive data with comprehensive debugging and better categorization.
+    Pages are streamed through extraction, OCR and detection one at a time;
+    (extraction, findings) is yielded as each page completes and result is
+    finalized once the generator is exhausted.
+    """
+    debug_info = result["debug_info"]
+    
+    if not debug_info["file_exists"]:
+        debug_info["error"] = "File does not exist"
+        result["status"] = "extraction_failed"
+        return
+    
+    findings = []
+    pattern_stats = {detector.name: {"raw_matches": 0} for detector in detectors}
+    text_characters = 0
     
     try:
-        # If extraction failed, return early
-        if result["debug_info"]["error"]:
-            result["status"] = "extraction_failed"
-            return result
+        with fitz.open(file_path) as doc:
+            debug_info["page_count"] = len(doc)
+            pages = iter_page_extractions(doc, file_path)
+            for extraction, page_findings in iter_page_findings(pages, debug_info, pattern_stats, detectors):
+                findings.extend(page_findings)
+                text_characters += len(extraction.text)
+                yield extraction, page_findings
         
-        text = result["debug_info"]["text_content"]
+        logger.info(f"Extraction complete: {debug_info['total_characters']} total characters, OCR used: {debug_info['ocr_used']}")
         
-        if not text or len(text.strip()) < 10:
+    except Exception as e:
+        # If extraction failed, return early
+        debug_info["error"] = str(e)
+        logger.error(f"Extraction failed: {e}")
+        result["status"] = "extraction_failed"
+        return
+    
+    try:
+        if text_characters < 10:
             result["status"] = "no_text_found"
             logger.warning("No substantial text found in PDF")
-            return result
+            return
         
-        detected_data = {}
-        patterns = {
-            "Aadhaar": r'\b\d{4}\s?\d{4}\s?\d{4}\b',
-            "PAN": r'\b[A-Z]{5}\d{4}[A-Z]{1}\b',
-            "Phone": r'(\+91[\-\s]?)?[6-9]\d{9}\b',
-            "Email": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            "Bank_Account": r'\b\d{9,18}\b',
-            "Credit_Debit_Card": r'\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b'
-        }
+        # Only non-empty categories are kept
+        result["detected_data"], result["locations"] = group_findings(findings)
         
-        for data_type, pattern in patterns.items():
-            try:
-                matches = re.findall(pattern, text)
-                
-                # Use advanced validation and categorization
-                valid_matches = validate_and_categorize_matches(text, matches, data_type)
-                
-                detected_data[data_type] = valid_matches
-                
-                result["patterns_checked"].append({
-                    "type": data_type,
-                    "pattern": pattern,
-                    "raw_matches": len(matches),
-                    "valid_matches": len(valid_matches),
-                    "sample": valid_matches[:2] if valid_matches else None,
-                    "validation_method": "context_aware"
-                })
-                
-                logger.info(f"{data_type}: {len(valid_matches)} valid matches (from {len(matches)} raw)")
-                
-            except Exception as pattern_error:
-                result["patterns_checked"].append({
-                    "type": data_type,
-                    "error": str(pattern_error)
-                })
-                logger.error(f"Pattern error for {data_type}: {pattern_error}")
+        for detector in detectors:
+            data_type = detector.name
+            stats = pattern_stats[data_type]
+            if "error" in stats:
+                result["patterns_checked"].append({"type": data_type, "error": stats["error"]})
+                continue
+            
+            valid_matches = result["detected_data"].get(data_type, [])
+            result["patterns_checked"].append({
+                "type": data_type,
+                "pattern": detector.pattern,
+                "raw_matches": stats["raw_matches"],
+                "valid_matches": len(valid_matches),
+                "sample": valid_matches[:2] if valid_matches else None,
+                "validation_method": "context_aware"
+            })
+            
+            logger.info(f"{data_type}: {len(valid_matches)} valid matches (from {stats['raw_matches']} raw)")
         
-        # Remove empty categories
-        result["detected_data"] = {k: v for k, v in detected_data.items() if v}
         result["status"] = "success"
         
         total_items = sum(len(v) for v in result["detected_data"].values())
@@ -334,44 +496,310 @@ def detect_sensitive_data_debug(file_path: str) -> dict:
         result["status"] = "detection_failed"
         result["error"] = str(e)
         logger.error(f"Detection failed: {e}")
-    
+
+def is_cacheable(result: dict) -> bool:
+    """
+    Only cache complete results; page-level failures (e.g. OCR errors) may be transient
+    """
+    if result["status"] not in ("success", "no_text_found"):
+        return False
+    return not any("error" in page for page in result["debug_info"]["characters_per_page"])
+
+def detection_cache_key(file_path: str, detectors: tuple, sha256: Optional[str] = None) -> str:
+    """
+    Results depend on the selected detectors' rules, not just their names.
+    sha256 is the content hash the store already has; without it the
+    file is hashed.
+    """
+    return DetectionCache.make_key(sha256 or file_sha256(file_path), DETECTOR_VERSION,
+                                   [detector.describe() for detector in detectors], ocr.OCR_MODE, CHECKSUMS)
+
+def get_cached_detection(file_path: str, key: str) -> Optional[dict]:
+    cached = detection_cache.get(key)
+    if cached is not None:
+        logger.info(f"Detection cache hit for {file_path}")
+        cached["debug_info"]["file_path"] = file_path
+        cached["cache"] = {"hit": True, "key": key}
+    return cached
+
+def store_detection(result: dict, key: str):
+    if is_cacheable(result):
+        detection_cache.put(key, result)
+    result["cache"] = {"hit": False, "key": key}
+
+def open_index(sha256: str, detectors: tuple) -> Optional[AnalysisWriter]:
+    """
+    Start the analysis artifact for a fresh pass over the document with
+    content hash sha256, which is written page by page as it is read. None
+    when only some detectors run and an artifact exists, since its
+    findings cover more.
+    """
+    try:
+        if len(detectors) < len(registry.names) and analysis_exists(sha256, DETECTOR_VERSION):
+            return None
+        return AnalysisWriter(sha256, DETECTOR_VERSION)
+    except Exception as e:
+        logger.warning(f"Could not start analysis artifact for {sha256}: {e}")
+        return None
+
+def save_index(sha256: str, result: dict, writer: Optional[AnalysisWriter] = None):
+    """
+    Store the analysis artifact redaction, verification and the report
+    read instead of reopening the document with content hash sha256.
+    writer holds the pages of a fresh pass; after a cache hit an existing
+    artifact is kept, or one with only the per-page statistics stored.
+    """
+    try:
+        if result["status"] != "success":
+            if writer is not None:
+                writer.discard()
+        elif writer is not None:
+            writer.finish(result)
+        elif not analysis_exists(sha256, DETECTOR_VERSION):
+            save_analysis(sha256, Analysis.from_detection(result, DETECTOR_VERSION))
+    except Exception as e:
+        # Only an optimization: redaction falls back to searching
+        logger.warning(f"Could not store analysis artifact for {result['debug_info']['file_path']}: {e}")
+
+def iter_cached_detection(file_path: str, result: dict, use_cache: bool, detectors: tuple,
+                          sha256: Optional[str] = None) -> Iterator[tuple]:
+    """
+    iter_detection() behind the content-hash cache. On a hit, result is
+    filled from the cache and no pages are yielded. Once exhausted, the
+    result is cached, the analysis artifact refreshed and the detection
+    metrics recorded, whichever endpoint is driving it.
+    """
+    start = time.perf_counter()
+    key = None
+    cached = None
+    exists = os.path.exists(file_path)
+    if exists:
+        # Keys both the cache and the analysis artifact
+        sha256 = sha256 or file_sha256(file_path)
+    if not use_cache or not exists:
+        cache = "off"
+    else:
+        key = detection_cache_key(file_path, detectors, sha256)
+        cached = get_cached_detection(file_path, key)
+        cache = "hit" if cached is not None else "miss"
+
+    writer = None
+    if cached is not None:
+        result.clear()
+        result.update(cached)
+    else:
+        if exists:
+            writer = open_index(sha256, detectors)
+        extractions = iter_detection(file_path, result, detectors)
+        try:
+            for extraction, findings in extractions:
+                if writer is not None:
+                    writer.add_page(PageRecord.from_extraction(extraction))
+                yield extraction, findings
+        except BaseException:
+            if writer is not None:
+                writer.discard()
+            raise
+        finally:
+            # Closes the document and cancels outstanding OCR if stopped early
+            extractions.close()
+        if key is not None:
+            store_detection(result, key)
+
+    if exists:
+        save_index(sha256, result, writer)
+    metrics.DETECTION_SECONDS.observe(time.perf_counter() - start, cache=cache)
+    metrics.DETECTIONS.inc(status=result["status"])
+
+def detect_sensitive_data_debug(file_path: str, use_cache: bool = True,
+                                on_page: Optional[Callable] = None,
+                                detectors: Optional[tuple] = None, sha256: Optional[str] = None) -> dict:
+    """
+    Detect sensitive data, answering from the content-hash cache when possible.
+    Runs the given detectors (from registry.select()), all of them by default.
+    sha256 is the stored content hash of the file, if known.
+    on_page(extraction, findings) is called as each page completes; an
+    exception it raises stops the run.
+    """
+    if detectors is None:
+        detectors = registry.select()
+    result = new_detection_result(file_path, detectors)
+    pages = iter_cached_detection(file_path, result, use_cache, detectors, sha256)
+    try:
+        for extraction, findings in pages:
+            if on_page is not None:
+                on_page(extraction, findings)
+    finally:
+        pages.close()
     return result
 
+def build_detection_response(file_id: str, detection_result: dict) -> dict:
+    """
+    The /data/{file_id} response body for a detection result
+    """
+    response_data = {
+        "success": True,
+        "file_id": file_id,
+        "detected_data": detection_result["detected_data"],
+        "locations": detection_result.get("locations", {}),
+        "detectors": detection_result.get("detectors", registry.names),
+        "debug_info": {
+            "status": detection_result["status"],
+            "page_count": detection_result["debug_info"]["page_count"],
+            "total_characters": detection_result["debug_info"]["total_characters"],
+            "ocr_used": detection_result["debug_info"]["ocr_used"],
+            "ocr_pages": detection_result["debug_info"]["ocr_pages"],
+            "patterns_checked": detection_result["patterns_checked"],
+            "cache_hit": detection_result.get("cache", {}).get("hit", False)
+        },
+        "message": f"Detection completed: {detection_result['status']}"
+    }
+    
+    # Include full debug info if there was an error
+    if detection_result["status"] != "success":
+        response_data["debug_info"]["extraction_details"] = detection_result["debug_info"]
+    
+    return response_data
+
+def detection_job(job: Job, file_id: str, file_path: str, use_cache: bool = True,
+                  detectors: Optional[tuple] = None) -> dict:
+    """
+    Background detection: reports pages done and stops between pages when
+    the job is cancelled
+    """
+    findings_count = 0
+    
+    def on_page(extraction, findings):
+        nonlocal findings_count
+        findings_count += len(findings)
+        job.progress = {"pages_done": extraction.page_number, "findings": findings_count}
+        job.check_cancelled()
+    
+    detection_result = detect_sensitive_data_debug(file_path, use_cache, on_page, detectors,
+                                                   content_store.sha256_for(file_id, "upload"))
+    return build_detection_response(file_id, detection_result)
+
+def submit_detection_job(file_id: str, file_path: str, use_cache: bool = True,
+                         detectors: Optional[tuple] = None) -> dict:
+    """
+    Queue a detection and return the body of a 202 response pointing at the job
+    """
+    params = {"file_id": file_id, "use_cache": use_cache}
+    if detectors is not None:
+        params["detectors"] = [detector.name for detector in detectors]
+    return submit_job("detect", detection_job, params, file_id, file_path, use_cache, detectors,
+                      file_id=file_id)
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_detection_events(file_id: str, file_path: str, use_cache: bool = True,
+                            detectors: Optional[tuple] = None, sha256: Optional[str] = None) -> Iterator[str]:
+    """
+    Server-Sent Events for a detection run: a progress event per page with
+    the findings completed on it, then a summary with the same body as
+    /data/{file_id}. Time to first finding is measured from the request.
+    """
+    started = time.perf_counter()
+    
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 2)
+    
+    if detectors is None:
+        detectors = registry.select()
+    result = new_detection_result(file_path, detectors)
+    pages = iter_cached_detection(file_path, result, use_cache, detectors, sha256)
+    first_finding_ms = None
+    
+    try:
+        for extraction, findings in pages:
+            if findings and first_finding_ms is None:
+                first_finding_ms = elapsed_ms()
+                metrics.TIME_TO_FIRST_FINDING_SECONDS.observe(first_finding_ms / 1000, source="pages")
+                logger.info(f"Time to first finding for {file_id}: {first_finding_ms} ms")
+            yield sse_event("page", {
+                "page": extraction.page_number,
+                "page_count": result["debug_info"]["page_count"],
+                "characters": len(extraction.text),
+                "ocr_used": extraction.ocr_used,
+                "error": extraction.error,
+                "findings": [dict(f.to_dict(), type=f.data_type) for f in findings],
+                "elapsed_ms": elapsed_ms()
+            })
+        if first_finding_ms is None and result["detected_data"]:
+            # Answered from the cache
+            first_finding_ms = elapsed_ms()
+            metrics.TIME_TO_FIRST_FINDING_SECONDS.observe(first_finding_ms / 1000, source="cache")
+        
+        summary = build_detection_response(file_id, result)
+        summary["timing"] = {
+            "time_to_first_finding_ms": first_finding_ms,
+            "total_ms": elapsed_ms()
+        }
+        yield sse_event("summary", summary)
+        
+    except Exception as e:
+        logger.error(f"Streaming detection error for {file_id}: {str(e)}")
+        yield sse_event("error", {"success": False, "file_id": file_id, "detail": str(e)})
+    finally:
+        pages.close()
+
+def locate_upload(file_id: str) -> tuple:
+    """
+    (local path, stored sha256) of an upload; the hash saves rehashing
+    the file for the cache key. (None, None) when there is no such upload.
+    """
+    file_path = content_store.path_for(file_id, "upload")
+    if file_path is None:
+        return None, None
+    return file_path, content_store.sha256_for(file_id, "upload")
+
+def select_detectors(names: Optional[List[str]]) -> Optional[tuple]:
+    """
+    The detectors a request asked for (?detectors=Email&detectors=Phone or
+    ?detectors=Email,Phone), None for all of them
+    """
+    if not names:
+        return None
+    try:
+        return registry.select(names)
+    except UnknownDetector as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/detectors")
+async def list_detectors():
+    """
+    The configured detectors, which /data/{file_id}?detectors=... selects from
+    """
+    return {"detectors": [detector.describe() for detector in registry.detectors.values()]}
+
 @router.post("/{file_id}")
-async def detect_data(file_id: str):
+async def detect_data(file_id: str, use_cache: bool = True, background: bool = False,
+                      detectors: Optional[List[str]] = Query(None)):
     """
-    Detect sensitive data with detailed response
+    Detect sensitive data with detailed response.
+    With background=true the detection is queued and a job id returned.
+    detectors limits the run to the named detectors; others are not scanned for.
     """
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    selected = select_detectors(detectors)
+    file_path, sha256 = await run_in_threadpool(locate_upload, file_id)
     
     logger.info(f"Detection request for file_id: {file_id}")
     logger.info(f"File path: {file_path}")
     
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
+    if file_path is None:
+        logger.error(f"File not found: {file_id}")
         raise HTTPException(status_code=404, detail="File not found")
     
+    if background:
+        return JSONResponse(submit_detection_job(file_id, file_path, use_cache, selected), status_code=202)
+    
     try:
-        detection_result = detect_sensitive_data_debug(file_path)
-        
-        response_data = {
-            "success": True,
-            "file_id": file_id,
-            "detected_data": detection_result["detected_data"],
-            "debug_info": {
-                "status": detection_result["status"],
-                "page_count": detection_result["debug_info"]["page_count"],
-                "total_characters": detection_result["debug_info"]["total_characters"],
-                "ocr_used": detection_result["debug_info"]["ocr_used"],
-                "ocr_pages": detection_result["debug_info"]["ocr_pages"],
-                "patterns_checked": detection_result["patterns_checked"]
-            },
-            "message": f"Detection completed: {detection_result['status']}"
-        }
-        
-        # Include full debug info if there was an error
-        if detection_result["status"] != "success":
-            response_data["debug_info"]["extraction_details"] = detection_result["debug_info"]
+        # Run the blocking extraction/OCR work off the event loop
+        detection_result = await run_in_threadpool(detect_sensitive_data_debug, file_path, use_cache, None, selected,
+                                                 sha256)
+        response_data = build_detection_response(file_id, detection_result)
         
         logger.info(f"Detection response: {detection_result['status']}")
         return JSONResponse(response_data)
@@ -381,20 +809,45 @@ async def detect_data(file_id: str):
         raise HTTPException(status_code=500, detail=f"Error detecting data: {str(e)}")
 
 @router.get("/{file_id}")
-async def detect_data_get(file_id: str):
+async def detect_data_get(file_id: str, use_cache: bool = True, background: bool = False,
+                          detectors: Optional[List[str]] = Query(None)):
     """
     GET endpoint for data detection (same as POST)
     """
-    return await detect_data(file_id)
+    return await detect_data(file_id, use_cache, background, detectors)
+
+@router.get("/{file_id}/stream")
+async def detect_data_stream(file_id: str, use_cache: bool = True,
+                             detectors: Optional[List[str]] = Query(None)):
+    """
+    Stream detection progress and findings page by page as Server-Sent Events
+    """
+    selected = select_detectors(detectors)
+    file_path, sha256 = await run_in_threadpool(locate_upload, file_id)
+    
+    logger.info(f"Streaming detection request for file_id: {file_id}")
+    
+    if file_path is None:
+        logger.error(f"File not found: {file_id}")
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # A plain generator: Starlette iterates it in the threadpool
+    return StreamingResponse(
+        stream_detection_events(file_id, file_path, use_cache, selected, sha256),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.post("/{file_id}/debug")
-async def debug_detection(file_id: str):
+async def debug_detection(file_id: str, use_cache: bool = False,
+                          detectors: Optional[List[str]] = Query(None)):
     """
     Detailed debug endpoint with full information
     """
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
+    selected = select_detectors(detectors)
+    file_path, sha256 = await run_in_threadpool(locate_upload, file_id)
     
-    if not os.path.exists(file_path):
+    if file_path is None:
         return {
             "success": False,
             "error": "File not found",
@@ -402,7 +855,8 @@ async def debug_detection(file_id: str):
             "file_exists": False
         }
     
-    detection_result = detect_sensitive_data_debug(file_path)
+    detection_result = await run_in_threadpool(detect_sensitive_data_debug, file_path, use_cache, None, selected,
+                                                 sha256)
     
     return {
         "success": True,
@@ -412,23 +866,57 @@ async def debug_detection(file_id: str):
         "detection_result": detection_result
     }
 
+@router.get("/cache/stats")
+async def detection_cache_stats():
+    """
+    Hit/miss counters and size of the detection and per-page OCR caches
+    """
+    return {
+        "detections": detection_cache.stats(),
+        "ocr_pages": ocr_page_cache.stats()
+    }
+
+@router.delete("/cache")
+async def clear_detection_cache():
+    """
+    Drop every cached detection result and OCR'd page
+    """
+    detection_cache.clear()
+    ocr_page_cache.clear()
+    return {"success": True, "message": "Detection caches cleared"}
+
 # Health check endpoint
 @router.get("/health/ocr")
 async def check_ocr_health():
     """
-    Check if OCR is working properly
+    Check if OCR is working properly: the engine in this process and, when
+    OCR runs in worker processes, a ping of every worker
     """
     try:
-        # Test OCR with a simple check
-        version = pytesseract.get_tesseract_version()
-        return {
-            "ocr_available": True,
-            "tesseract_version": str(version),
-            "status": "healthy"
-        }
+        # Loading the engine (and its language model) blocks
+        engine = await run_in_threadpool(ocr_engine.get_engine, ocr.OCR_LANG)
+        version = await run_in_threadpool(engine.version)
     except Exception as e:
         return {
             "ocr_available": False,
             "error": str(e),
             "status": "unavailable"
-        }
\ No newline at end of file
+        }
+
+    pool = ocr.get_ocr_pool()
+    if pool is None:
+        return {
+            "ocr_available": True,
+            "tesseract_version": version,
+            "status": "healthy",
+            "pool": {"mode": "inline", **engine.describe()}
+        }
+
+    pool_status = await run_in_threadpool(pool.check)
+    healthy = pool_status["last_check"]["healthy"]
+    return {
+        "ocr_available": healthy,
+        "tesseract_version": version,
+        "status": "healthy" if healthy else "degraded",
+        "pool": pool_status
+    }
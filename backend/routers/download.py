@@ -1,73 +1,163 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-import os
-import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+from email.utils import formatdate
+from typing import Optional, Tuple
+from services.storage import content_store
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-REDACTED_DIR = "redacted"
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file"""
 
-# Ensure directories exist
-os.makedirs(REDACTED_DIR, exist_ok=True)
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive offsets.
+    Returns None when the header should be ignored (other units, several
+    ranges or bad syntax), in which case the whole file is sent.
+    """
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # "bytes=-N": the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start < 0 or end < start:
+        return None
+    return start, end
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, so W/ prefixes are ignored)"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def stored_file_response(request: Optional[Request], file_id: str, kind: str,
+                         media_type: str, filename: str) -> Optional[Response]:
+    """
+    Response for a stored file, or None if it is missing. The content hash
+    is the ETag, so conditional requests get 304 and a single Range gets
+    206 with just those bytes. Whole files that are on local disk go out
+    as a FileResponse (sendfile-style pathsend where the server offers it);
+    everything else is streamed from the storage backend.
+    """
+    meta = content_store.stat(file_id, kind)
+    if meta is None:
+        return None
+
+    size = meta["size"]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Last-Modified": formatdate(meta["created_at"], usegmt=True),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        # The same file_id can be redacted again, so clients must revalidate
+        "Cache-Control": "private, no-cache"
+    }
+    etag = f'"{meta["sha256"]}"' if meta["sha256"] else None
+    if etag is not None:
+        headers["ETag"] = etag
+
+    request_headers = request.headers if request is not None else {}
+
+    if_none_match = request_headers.get("if-none-match")
+    if etag is not None and if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Disposition"})
+
+    byte_range = None
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    # If-Range: only honour the range when the client has the current version
+    if range_header and (if_range is None or if_range in (etag, headers["Last-Modified"])):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        if meta["path"] is not None and not range_header:
+            return FileResponse(meta["path"], media_type=media_type, headers=headers)
+        stream = content_store.iter_bytes(file_id, kind)
+        if stream is None:
+            return None
+        return StreamingResponse(stream, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    stream = content_store.iter_bytes(file_id, kind, start, end)
+    if stream is None:
+        return None
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(stream, status_code=206, media_type=media_type, headers=headers)
 
 @router.get("/{file_id}")
-async def download_redacted_file(file_id: str):
+async def download_redacted_file(file_id: str, request: Request):
     """
-    Download redacted PDF file
+    Download redacted PDF file. Supports Range/If-Range and ETag
+    revalidation, so viewers can fetch large PDFs piece by piece.
     """
-    file_path = os.path.join(REDACTED_DIR, f"{file_id}_redacted.pdf")
-    print(f"Looking for redacted file: {file_path}")
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Redacted file not found")
-    
-    return FileResponse(
-        file_path,
-        media_type='application/pdf',
-        filename=f"redacted_document_{file_id}.pdf"
+    response = await run_in_threadpool(
+        stored_file_response, request, file_id, "redacted", 'application/pdf', f"redacted_document_{file_id}.pdf"
     )
+    if response is None:
+        raise HTTPException(status_code=404, detail="Redacted file not found")
+    return response
 
 @router.get("/{file_id}/report")
-async def download_verification_report(file_id: str):
+async def download_verification_report(file_id: str, request: Request):
     """
     Download verification report
     """
-    report_path = os.path.join(REDACTED_DIR, f"{file_id}_report.json")
-    print(f"Looking for report file: {report_path}")
-    
-    if not os.path.exists(report_path):
-        raise HTTPException(status_code=404, detail="Verification report not found")
-    
-    return FileResponse(
-        report_path,
-        media_type='application/json',
-        filename=f"verification_report_{file_id}.json"
+    response = await run_in_threadpool(
+        stored_file_response, request, file_id, "report", 'application/json', f"verification_report_{file_id}.json"
     )
+    if response is None:
+        raise HTTPException(status_code=404, detail="Verification report not found")
+    return response
 
 @router.get("/{file_id}/info")
 async def get_download_info(file_id: str):
     """
-    Get download information including file sizes
+    Get download information including file sizes, answered from the
+    storage index in one query
     """
-    pdf_path = os.path.join(REDACTED_DIR, f"{file_id}_redacted.pdf")
-    report_path = os.path.join(REDACTED_DIR, f"{file_id}_report.json")
-    
-    print(f"Checking files: {pdf_path}, {report_path}")
+    meta = await run_in_threadpool(content_store.stat_many, file_id, ["redacted", "report", "upload"])
+    pdf_size = meta["redacted"]["size"] if "redacted" in meta else None
+    report_size = meta["report"]["size"] if "report" in meta else None
+    original_size = meta["upload"]["size"] if "upload" in meta else None
     
     info = {
         "file_id": file_id,
-        "pdf_available": os.path.exists(pdf_path),
-        "report_available": os.path.exists(report_path),
+        "pdf_available": pdf_size is not None,
+        "report_available": report_size is not None,
     }
     
-    if os.path.exists(pdf_path):
-        info["pdf_size"] = os.path.getsize(pdf_path)
+    if pdf_size is not None:
+        info["pdf_size"] = pdf_size
         info["pdf_size_mb"] = round(info["pdf_size"] / (1024 * 1024), 2)
+        if meta["redacted"]["sha256"]:
+            info["pdf_etag"] = f'"{meta["redacted"]["sha256"]}"'
+        
+        if original_size is not None:
+            info["original_size"] = original_size
+            info["original_size_mb"] = round(info["original_size"] / (1024 * 1024), 2)
+            if info["original_size"]:
+                info["size_ratio"] = round(info["pdf_size"] / info["original_size"], 3)
     
-    if os.path.exists(report_path):
-        info["report_size"] = os.path.getsize(report_path)
+    if report_size is not None:
+        info["report_size"] = report_size
         info["report_size_kb"] = round(info["report_size"] / 1024, 2)
     
-    print(f"Download info: {info}")
     return info
\ No newline at end of file
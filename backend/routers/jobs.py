@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException
+from typing import Callable, Optional
+from services.jobs import QueueFull, job_manager
+
+router = APIRouter()
+
+# Seconds a client refused by a full queue is told to wait
+QUEUE_FULL_RETRY_AFTER = 5
+
+def submit_job(job_type: str, func: Callable, params: dict, *args, **fields) -> dict:
+    """
+    Queue func(job, *args) and return the body of the 202 response pointing
+    at the job, with fields (file_id, batch_id, ...) added. A full queue
+    is a 503 to retry later.
+    """
+    try:
+        job = job_manager.submit(job_type, func, params, *args)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER)})
+    return {
+        "success": True,
+        **fields,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+@router.get("/")
+async def list_jobs(type: Optional[str] = None, status: Optional[str] = None):
+    """
+    List known jobs, optionally filtered by type and status
+    """
+    jobs = job_manager.list(job_type=type, status=status)
+    return {
+        "jobs": [job.to_dict() for job in jobs],
+        "stats": job_manager.stats()
+    }
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """
+    Status of a background job, with its result once it has succeeded
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
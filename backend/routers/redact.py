@@ -1,100 +1,268 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from typing import Callable, Optional
+from starlette.concurrency import run_in_threadpool
 import os
+import time
+import shutil
 import fitz  # PyMuPDF
 from datetime import datetime
+from collections import defaultdict
 import json
+from services.scanner import DETECTOR_VERSION
+from services.analysis import Analysis, load_analysis
+from services.cache import file_sha256
+from services.jobs import Job, JobCancelled
+from routers.jobs import submit_job
+from services.storage import content_store
+from services import metrics
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-REDACTED_DIR = "redacted"
-
-# Ensure directories exist
-os.makedirs(REDACTED_DIR, exist_ok=True)
+# doc.save() presets. Incremental saving is deliberately not offered: it
+# appends to the original file, so the redacted content would still be in it.
+SAVE_MODES = {
+    "fast": {"garbage": 0, "deflate": False, "use_objstms": False},
+    "compact": {"garbage": 3, "deflate": True, "use_objstms": True},
+    "max": {"garbage": 4, "deflate": True, "deflate_images": True, "deflate_fonts": True,
+            "use_objstms": True, "clean": True},
+}
+DEFAULT_SAVE_MODE = "compact"
 
 class RedactionRequest(BaseModel):
     items_to_redact: dict
+    save_mode: str = DEFAULT_SAVE_MODE
+    # Per-request overrides of the save_mode preset
+    garbage: Optional[int] = None
+    deflate: Optional[bool] = None
+    use_objstms: Optional[bool] = None
+
+def save_options(request: RedactionRequest) -> dict:
+    """
+    Keyword arguments for doc.save() from the request's mode and overrides
+    """
+    if request.save_mode not in SAVE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown save_mode '{request.save_mode}', expected one of {list(SAVE_MODES)}"
+        )
+    options = dict(SAVE_MODES[request.save_mode])
+    if request.garbage is not None:
+        if not 0 <= request.garbage <= 4:
+            raise HTTPException(status_code=400, detail="garbage must be between 0 and 4")
+        options["garbage"] = request.garbage
+    if request.deflate is not None:
+        options["deflate"] = request.deflate
+    if request.use_objstms is not None:
+        options["use_objstms"] = request.use_objstms
+    return options
+
+def redact_file(file_id: str, file_path: str, request: RedactionRequest,
+                options: dict, on_page: Optional[Callable] = None) -> dict:
+    """
+    Redact into the store, write the verification report and build the
+    response body
+    """
+    # Place boxes from detection's analysis artifact when there is one
+    sha256 = content_store.sha256_for(file_id, "upload") or file_sha256(file_path)
+    analysis = load_analysis(sha256, DETECTOR_VERSION)
+    output_path = content_store.temp_path(".pdf")
+    try:
+        redaction_result = perform_redaction(
+            file_path, output_path, request.items_to_redact, analysis, options, on_page
+        )
+        content_store.put_file(file_id, "redacted", output_path)
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    
+    # Generate verification report
+    verification_data = generate_verification_report(request.items_to_redact, file_id, analysis)
+    
+    # Save verification report
+    save_verification_report(verification_data)
+    
+    return {
+        "success": True,
+        "file_id": file_id,
+        "download_url": f"/download/{file_id}",
+        "verification_url": f"/download/{file_id}/report",
+        "redacted_count": redaction_result["redacted_count"],
+        "indexed_items": redaction_result["indexed_items"],
+        "searched_items": redaction_result["searched_items"],
+        "pages_redacted": redaction_result["pages_redacted"],
+        "save_mode": request.save_mode,
+        "input_size": redaction_result["input_size"],
+        "output_size": redaction_result["output_size"],
+        "save_time": redaction_result["save_time"],
+        "verification_report": verification_data
+    }
+
+def redaction_job(job: Job, file_id: str, file_path: str,
+                  request: RedactionRequest, options: dict) -> dict:
+    """
+    Background redaction: reports pages done and stops between pages when
+    the job is cancelled
+    """
+    def on_page(page_number, page_count):
+        job.progress = {"pages_done": page_number, "page_count": page_count}
+        job.check_cancelled()
+    
+    return redact_file(file_id, file_path, request, options, on_page)
 
 @router.post("/{file_id}")
-async def redact_data(file_id: str, request: RedactionRequest):
+async def redact_data(file_id: str, request: RedactionRequest, background: bool = False):
     """
-    Redact selected sensitive data from PDF
+    Redact selected sensitive data from PDF.
+    With background=true the redaction is queued and a job id returned.
     """
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
-    output_path = os.path.join(REDACTED_DIR, f"{file_id}_redacted.pdf")
+    file_path = await run_in_threadpool(content_store.path_for, file_id, "upload")
     
-    print(f"Redacting file: {file_path}")
-    print(f"Output path: {output_path}")
+    print(f"Redacting file: {file_id} ({file_path})")
     print(f"Items to redact: {request.items_to_redact}")
     
-    if not os.path.exists(file_path):
+    if file_path is None:
         raise HTTPException(status_code=404, detail="File not found")
     
+    options = save_options(request)
+    
+    if background:
+        return JSONResponse(submit_job("redact", redaction_job, {"file_id": file_id},
+                                       file_id, file_path, request, options, file_id=file_id),
+                            status_code=202)
+    
     try:
-        # Perform actual redaction
-        redaction_result = perform_redaction(file_path, output_path, request.items_to_redact)
-        
-        # Generate verification report
-        verification_data = generate_verification_report(request.items_to_redact, file_id)
-        
-        # Save verification report
-        save_verification_report(verification_data)
-        
-        return {
-            "success": True,
-            "file_id": file_id,
-            "download_url": f"/download/{file_id}",
-            "verification_url": f"/download/{file_id}/report",
-            "redacted_count": redaction_result["redacted_count"],
-            "verification_report": verification_data
-        }
+        # PyMuPDF work is blocking; keep it off the event loop
+        return await run_in_threadpool(redact_file, file_id, file_path, request, options)
     except Exception as e:
         print(f"Redaction error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Redaction failed: {str(e)}")
 
-def perform_redaction(input_path: str, output_path: str, items_to_redact: dict):
+def unique_items(items_to_redact: dict) -> list:
+    """Every value to redact once, in request order"""
+    return list(dict.fromkeys(item for items in items_to_redact.values() for item in items))
+
+def add_rect(rects: list, rect: fitz.Rect):
+    """Add a box unless one already there covers it (to within a point)"""
+    if not any((box + (-1, -1, 1, 1)).contains(rect) for box in rects):
+        rects.append(rect)
+
+def perform_redaction(input_path: str, output_path: str, items_to_redact: dict,
+                      analysis: Optional[Analysis] = None, options: dict = None,
+                      on_page: Optional[Callable] = None):
     """
-    Perform actual PDF redaction using PyMuPDF
+    Perform actual PDF redaction using PyMuPDF.
+    Items detection found are boxed at the rectangles in its analysis
+    artifact. Those only cover the occurrences detection validated, so
+    every item is also searched for, but only on the pages whose recorded
+    text contains it (everywhere when the artifact has no words for the
+    document). Only pages with boxes are rewritten, and a document with
+    none is copied as is.
+    on_page(pages_done, page_count) is called before each page.
     """
+    if options is None:
+        options = SAVE_MODES[DEFAULT_SAVE_MODE]
+    redaction_start = time.perf_counter()
     try:
         doc = fitz.open(input_path)
         redacted_count = 0
+        pages_redacted = 0
+        
+        # page number (1-based) -> rectangles from the artifact
+        page_rects = defaultdict(list)
+        searched = []
+        for data_type, items in items_to_redact.items():
+            for item in items:
+                rects = analysis.lookup_rects(data_type, item) if analysis else None
+                if rects:
+                    for page_number, x0, y0, x1, y1 in rects:
+                        add_rect(page_rects[page_number], fitz.Rect(x0, y0, x1, y1))
+                else:
+                    searched.append(item)
+        
+        # page number -> items to search for on it
+        search_pages = defaultdict(list)
+        search_everywhere = []
+        for item in unique_items(items_to_redact):
+            located = analysis.locate_text(item) if analysis else None
+            if located is None or not (located[0] or located[1]):
+                search_everywhere.append(item)
+                continue
+            text_pages, ocr_rects = located
+            for page_number in text_pages:
+                search_pages[page_number].append(item)
+            # Text only in images: search_for() cannot see it
+            for page_number, x0, y0, x1, y1 in ocr_rects:
+                add_rect(page_rects[page_number], fitz.Rect(x0, y0, x1, y1))
         
         for page_num in range(len(doc)):
+            if on_page is not None:
+                on_page(page_num, len(doc))
+            
+            rects = page_rects.get(page_num + 1, [])
+            page_items = search_everywhere + search_pages.get(page_num + 1, [])
+            if not rects and not page_items:
+                continue
             page = doc[page_num]
+            for item in page_items:
+                # Search for the text and redact it
+                for rect in page.search_for(item):
+                    add_rect(rects, rect)
             
-            for data_type, items in items_to_redact.items():
-                for item in items:
-                    # Search for the text and redact it
-                    text_instances = page.search_for(item)
-                    
-                    for inst in text_instances:
-                        # Add redaction annotation
-                        redact_annot = page.add_redact_annot(inst, fill=(0, 0, 0))
-                        redact_annot.update()
-                        redacted_count += 1
+            if not rects:
+                continue
+            
+            for rect in rects:
+                # Add redaction annotation
+                page.add_redact_annot(rect, fill=(0, 0, 0))
+                redacted_count += 1
             
             # Apply redactions
             page.apply_redactions()
+            pages_redacted += 1
         
-        doc.save(output_path)
+        start = time.perf_counter()
+        if pages_redacted:
+            doc.save(output_path, **options)
+        else:
+            shutil.copyfile(input_path, output_path)
+        save_time = round(time.perf_counter() - start, 4)
         doc.close()
         
-        print(f"Redaction completed: {redacted_count} items redacted")
+        indexed_count = sum(len(items) for items in items_to_redact.values()) - len(searched)
+        input_size = os.path.getsize(input_path)
+        output_size = os.path.getsize(output_path)
+        print(f"Redaction completed: {redacted_count} items redacted on {pages_redacted} pages "
+              f"({indexed_count} from index, {len(searched)} found by search alone)")
+        print(f"Saved {output_size} bytes (input {input_size}) in {save_time}s")
+        metrics.REDACTION_SECONDS.observe(time.perf_counter() - redaction_start)
+        metrics.REDACTION_SAVE_SECONDS.observe(save_time)
+        metrics.REDACTION_OUTPUT_BYTES.observe(output_size)
+        metrics.REDACTION_BOXES.inc(redacted_count)
         return {
             "redacted_count": redacted_count,
+            "indexed_items": indexed_count,
+            "searched_items": len(searched),
+            "pages_redacted": pages_redacted,
+            "input_size": input_size,
+            "output_size": output_size,
+            "save_time": save_time,
             "output_path": output_path
         }
         
+    except JobCancelled:
+        doc.close()
+        raise
     except Exception as e:
         raise Exception(f"PDF redaction error: {str(e)}")
 
-def generate_verification_report(items_to_redact: dict, file_id: str):
+def generate_verification_report(items_to_redact: dict, file_id: str, analysis: Optional[Analysis] = None):
     """
-    Generate verification report for redacted items
+    Generate verification report for redacted items, with the pages
+    detection found each one on when its analysis artifact is available
     """
-    return {
+    report = {
         "file_id": file_id,
         "redaction_timestamp": datetime.utcnow().isoformat(),
         "redacted_items": items_to_redact,
@@ -103,14 +271,16 @@ def generate_verification_report(items_to_redact: dict, file_id: str):
             "by_type": {k: len(v) for k, v in items_to_redact.items()}
         }
     }
+    if analysis is not None:
+        found_on = analysis.item_pages()
+        report["item_pages"] = {
+            data_type: {item: found_on.get(data_type, {}).get(item, []) for item in items}
+            for data_type, items in items_to_redact.items()
+        }
+        report["analysis"] = analysis.summary()
+    return report
 
 def save_verification_report(verification_data: dict):
-    """Save verification report to JSON file"""
+    """Save verification report to the store"""
     file_id = verification_data["file_id"]
-    report_path = os.path.join(REDACTED_DIR, f"{file_id}_report.json")
-    
-    with open(report_path, 'w') as f:
-        json.dump(verification_data, f, indent=2)
-    
-    print(f"Verification report saved: {report_path}")
-    return report_path
\ No newline at end of file
+    content_store.put_bytes(file_id, "report", json.dumps(verification_data, indent=2).encode())
\ No newline at end of file
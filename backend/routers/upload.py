@@ -1,62 +1,239 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import os
+import time
 import uuid
+import hashlib
+import logging
+from typing import Optional
+from routers.detect import submit_detection_job
+from services.storage import content_store
+from services import metrics
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+try:
+    import magic
+except ImportError:  # libmagic missing: fall back to the header check alone
+    magic = None
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-@router.post("/")
-async def upload_pdf(file: UploadFile = File(...)):
-    """
-    Upload a PDF file and return a unique file_id
-    """
-    print(f"Received file: {file.filename}, content-type: {file.content_type}")  # Debug log
-    
-    # Validate file type
-    if file.content_type != "application/pdf":
-        raise HTTPException(
-            status_code=400, 
-            detail="Only PDF files are allowed. Received: {file.content_type}"
-        )
-    
-    # Validate file size (10MB limit)
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Reset to beginning
-    
-    if file_size > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File size exceeds 10MB limit")
-    
-    # Generate unique file ID
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+# Room for multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+# The %PDF- marker must appear within the first 1024 bytes
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
+class UploadRejected(Exception):
+    """Raised while streaming an upload that must not be stored"""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def sniff_pdf(head: bytes) -> Optional[str]:
+    """
+    Check the first bytes of a file. Returns why it is not a PDF, or None.
+    The header decides, as it does for PDF readers: libmagic only knows
+    a PDF whose header is at offset 0, so it just names what was sent
+    instead of a file without one.
+    """
+    if PDF_MAGIC in head[:PDF_HEADER_WINDOW]:
+        return None
+    if magic is not None:
+        return f"Only PDF files are allowed. Detected: {magic.from_buffer(head, mime=True)}"
+    return "Only PDF files are allowed: missing %PDF header"
+
+class PdfUploadWriter:
+    """
+    Writes an uploaded file to a temporary path chunk by chunk, hashing it
+    and enforcing the size limit as it goes. The header is checked as soon
+    as enough bytes have arrived, so a non-PDF is rejected early.
+    """
+    def __init__(self, path: str, max_size: int = MAX_UPLOAD_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.head = b""
+        self.checked = False
+        self.file = open(path, "wb")
+
+    def write(self, data: bytes):
+        if not self.checked:
+            self.head += data[:PDF_HEADER_WINDOW]
+            if len(self.head) >= PDF_HEADER_WINDOW:
+                self.check_header()
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadRejected(413, f"File size exceeds {self.max_size // (1024 * 1024)}MB limit")
+        self.sha256.update(data)
+        self.file.write(data)
+
+    def check_header(self):
+        self.checked = True
+        reason = sniff_pdf(self.head)
+        if reason is not None:
+            raise UploadRejected(400, reason)
+
+    def finish(self) -> str:
+        """Close the file and return its hex digest"""
+        if not self.checked:
+            self.check_header()
+        self.file.close()
+        return self.sha256.hexdigest()
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+async def receive_pdf(request: Request, path: str, field_name: str = "file") -> tuple:
+    """
+    Stream the multipart request body, writing the field_name part to path
+    as it arrives. Returns (filename, writer).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejected(400, "Expected a multipart/form-data upload")
+
+    # Refuse an oversized body before reading any of it
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+        raise UploadRejected(413, f"File size exceeds {MAX_UPLOAD_SIZE // (1024 * 1024)}MB limit")
+
+    state = {"header_field": b"", "header_value": b"", "headers": {}, "in_file": False, "filename": None}
+    pending = []  # file data parsed from the latest chunk, written off the event loop
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["in_file"] = False
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if options.get(b"name", b"").decode("latin-1") == field_name and b"filename" in options:
+            if state["filename"] is not None:
+                raise UploadRejected(400, "Only one file may be uploaded")
+            state["in_file"] = True
+            state["filename"] = options[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(data, start, end):
+        if state["in_file"]:
+            pending.append(data[start:end])
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+
+    writer = PdfUploadWriter(path)
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                await run_in_threadpool(writer.write, data)
+        parser.finalize()
+        if state["filename"] is None:
+            raise UploadRejected(400, f"No '{field_name}' file in the upload")
+    except BaseException:
+        writer.discard()
+        raise
+    return state["filename"], writer
+
+@router.post("/", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}}
+        }}}
+    }
+})
+async def upload_pdf(request: Request, detect: bool = False):
+    """
+    Upload a PDF file and return a unique file_id.
+    The body is streamed to disk in chunks while it is hashed, size-checked
+    and sniffed, so bad files are refused before they are fully received.
+    Identical content is stored once and shared between file_ids.
+    With detect=true a background detection job is queued for it.
+    """
+    start = time.perf_counter()
+    tmp_path = await run_in_threadpool(content_store.temp_path, ".part")
     file_id = str(uuid.uuid4())
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
 
     try:
-        # Save the uploaded PDF
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        print(f"File saved successfully: {file_path}")  # Debug log
-        
-        # Return success response with file_id
-        return JSONResponse({
-            "success": True,
-            "file_id": file_id,
-            "filename": file.filename,
-            "message": "File uploaded successfully"
-        })
+        filename, writer = await receive_pdf(request, tmp_path)
+        logger.info(f"Received file: {filename}, {writer.size} bytes")
+        sha256 = await run_in_threadpool(writer.finish)
+        stored = await run_in_threadpool(content_store.put_file, file_id, "upload", tmp_path, sha256)
+        duplicate = stored["duplicate"]
+        logger.info(f"File saved: {file_id} (duplicate content: {duplicate})")
+        metrics.UPLOADS.inc(outcome="duplicate" if duplicate else "stored")
+        metrics.UPLOAD_BYTES.observe(writer.size)
+        metrics.UPLOAD_SECONDS.observe(time.perf_counter() - start)
+    except UploadRejected as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        logger.info(f"Upload rejected: {e.detail}")
+        metrics.UPLOADS.inc(outcome="rejected")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         # Clean up file if there's an error
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        print(f"Error processing file: {str(e)}")  # Debug log
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        logger.exception(f"Error processing file: {e}")
+        metrics.UPLOADS.inc(outcome="error")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+    response = {
+        "success": True,
+        "file_id": file_id,
+        "filename": filename,
+        "size": writer.size,
+        "sha256": sha256,
+        "duplicate": duplicate,
+        "message": "File uploaded successfully"
+    }
+    if detect:
+        try:
+            file_path = await run_in_threadpool(content_store.path_for, file_id, "upload")
+            job = submit_detection_job(file_id, file_path)
+            response["job_id"] = job["job_id"]
+            response["status_url"] = job["status_url"]
+        except HTTPException as e:
+            # The upload itself succeeded; detection can be requested later
+            response["job_error"] = e.detail
+
+    # Return success response with file_id
+    return JSONResponse(response)
+
 @router.get("/test")
 async def test_upload():
     """Test endpoint for upload router"""
-    return {"message": "Upload router is working!"}
\ No newline at end of file
+    return {"message": "Upload router is working!"}
@@ -1,33 +1,40 @@
 from fastapi import APIRouter, HTTPException
-import os
+from starlette.concurrency import run_in_threadpool
 import json
+from services.analysis import load_analysis
+from services.scanner import DETECTOR_VERSION
+from services.storage import content_store
 
 router = APIRouter()
 
-REDACTED_DIR = "redacted"
-
 @router.get("/{file_id}")
 async def get_verification_status(file_id: str):
     """
     Get verification status for a redacted file
     """
-    report_path = os.path.join(REDACTED_DIR, f"{file_id}_report.json")
-    pdf_path = os.path.join(REDACTED_DIR, f"{file_id}_redacted.pdf")
+    report_data = await run_in_threadpool(content_store.read_bytes, file_id, "report")
+    pdf_size = await run_in_threadpool(content_store.size_for, file_id, "redacted")
     
-    if not os.path.exists(report_path):
+    if report_data is None:
         raise HTTPException(status_code=404, detail="Verification report not found")
     
     try:
-        with open(report_path, 'r') as f:
-            report = json.load(f)
+        report = json.loads(report_data)
         
         # Add file status information
         report["file_status"] = {
-            "redacted_pdf_exists": os.path.exists(pdf_path),
+            "redacted_pdf_exists": pdf_size is not None,
             "report_exists": True,
-            "redacted_pdf_size": os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0
+            "redacted_pdf_size": pdf_size or 0
         }
         
+        # Reports written before the analysis artifact existed: read it now
+        if "analysis" not in report:
+            sha256 = await run_in_threadpool(content_store.sha256_for, file_id, "upload")
+            analysis = await run_in_threadpool(load_analysis, sha256, DETECTOR_VERSION)
+            if analysis is not None:
+                report["analysis"] = analysis.summary()
+        
         return report
         
     except Exception as e:
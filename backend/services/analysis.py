@@ -0,0 +1,313 @@
+import os
+import hashlib
+import logging
+from array import array
+from typing import Optional
+import msgpack
+from services.layout import PageLayout
+from services.storage import content_store
+
+logger = logging.getLogger(__name__)
+
+# Bump when the record layout below changes. An artifact is a sequence of
+# msgpack objects: [format, detector version], one list per page, then
+# {"page_count", "findings"}, so pages can be written as they are read.
+ARTIFACT_FORMAT = 2
+
+def analysis_kind(detector_version: str) -> str:
+    """
+    The artifact is stored as (document sha256, analysis_kind(version)), so
+    whether a current one exists is an index lookup, not a download
+    """
+    return f"analysis-v{ARTIFACT_FORMAT}-{detector_version}"
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+def pack_words(layout: Optional[PageLayout]) -> Optional[list]:
+    """
+    A layout's words as [texts, line ids, rects]: rects are float32
+    x0, y0, x1, y1 per word and line ids only change where a line breaks,
+    which is all PageLayout needs to rebuild the same text
+    """
+    if layout is None:
+        return None
+    texts = []
+    lines = array("I")
+    rects = array("f")
+    line_id = 0
+    previous = None
+    for word in layout.words:
+        line = (word[5], word[6])
+        if previous is not None and line != previous:
+            line_id += 1
+        previous = line
+        texts.append(word[4])
+        lines.append(line_id)
+        rects.extend(word[:4])
+    return [texts, lines.tobytes(), rects.tobytes()]
+
+def unpack_words(packed: Optional[list]) -> Optional[PageLayout]:
+    if packed is None:
+        return None
+    texts, line_bytes, rect_bytes = packed
+    lines = array("I")
+    lines.frombytes(line_bytes)
+    rects = array("f")
+    rects.frombytes(rect_bytes)
+    return PageLayout([
+        (rects[i * 4], rects[i * 4 + 1], rects[i * 4 + 2], rects[i * 4 + 3], text, 0, lines[i], i)
+        for i, text in enumerate(texts)
+    ])
+
+def normalize_text(text: str) -> str:
+    """Lowercased, whitespace collapsed: how a search for a typed item sees page text"""
+    return " ".join(text.split()).lower()
+
+class PageRecord:
+    """
+    What detection learned about one page. Word layouts are None when the
+    page came from a cached detection result rather than a fresh pass.
+    """
+    __slots__ = ("number", "characters", "text_hash", "ocr_used", "needs_ocr", "words", "ocr_words",
+                 "_layouts")
+
+    def __init__(self, number: int, characters: int = 0, text_hash: Optional[bytes] = None,
+                 ocr_used: bool = False, needs_ocr: bool = False, words: Optional[list] = None,
+                 ocr_words: Optional[list] = None):
+        self.number = number
+        self.characters = characters
+        self.text_hash = text_hash
+        self.ocr_used = ocr_used
+        self.needs_ocr = needs_ocr
+        self.words = words
+        self.ocr_words = ocr_words
+        self._layouts = None
+
+    @classmethod
+    def from_extraction(cls, extraction) -> "PageRecord":
+        """From a detection PageExtraction"""
+        decision = extraction.ocr_decision
+        return cls(
+            extraction.page_number,
+            len(extraction.text),
+            text_hash(extraction.text),
+            extraction.ocr_used,
+            bool(decision is not None and decision.needs_ocr),
+            pack_words(extraction.layout),
+            pack_words(extraction.ocr_layout) if extraction.ocr_used else None
+        )
+
+    def layouts(self) -> Optional[tuple]:
+        """(text layer layout, OCR layout or None), or None when words were not recorded"""
+        if self.words is None:
+            return None
+        if self._layouts is None:
+            self._layouts = (unpack_words(self.words), unpack_words(self.ocr_words))
+        return self._layouts
+
+    def to_list(self) -> list:
+        return [self.number, self.characters, self.text_hash, self.ocr_used, self.needs_ocr,
+                self.words, self.ocr_words]
+
+class FindingRecord:
+    """One located detection: page is 1-based, rects are [page, x0, y0, x1, y1]"""
+    __slots__ = ("data_type", "value", "page", "start", "end", "rects")
+
+    def __init__(self, data_type: str, value: str, page: int, start: int, end: int, rects: list):
+        self.data_type = data_type
+        self.value = value
+        self.page = page
+        self.start = start
+        self.end = end
+        self.rects = rects
+
+    def to_list(self) -> list:
+        return [self.data_type, self.value, self.page, self.start, self.end, self.rects]
+
+def finding_records(detection_result: dict) -> list:
+    return [
+        FindingRecord(data_type, location["value"], location["page"], location["start"],
+                      location["end"], location.get("rects", []))
+        for data_type, locations in detection_result.get("locations", {}).items()
+        for location in locations
+    ]
+
+def trailer(page_count: int, findings: list) -> dict:
+    return {"page_count": page_count, "findings": [finding.to_list() for finding in findings]}
+
+class Analysis:
+    """
+    The per-document artifact detection stores with each upload, so
+    redaction, verification and the report can use what detection learned
+    without reopening or re-parsing the PDF
+    """
+    __slots__ = ("detector_version", "page_count", "pages", "findings", "_by_value")
+
+    def __init__(self, detector_version: str, page_count: int, pages: list, findings: list):
+        self.detector_version = detector_version
+        self.page_count = page_count
+        self.pages = pages
+        self.findings = findings
+        self._by_value = None
+
+    @classmethod
+    def from_detection(cls, detection_result: dict, detector_version: str,
+                       pages: Optional[list] = None) -> "Analysis":
+        """
+        Build from a detection result and, after a fresh pass, its
+        PageRecords. A cached result only has the per-page statistics.
+        """
+        if pages is None:
+            pages = [
+                PageRecord(info["page"], info["characters"], ocr_used=info["ocr_used"],
+                           needs_ocr=info.get("ocr_decision", {}).get("needs_ocr", False))
+                for info in detection_result["debug_info"]["characters_per_page"]
+            ]
+        return cls(detector_version, detection_result["debug_info"]["page_count"], pages,
+                   finding_records(detection_result))
+
+    def pack(self) -> bytes:
+        packer = msgpack.Packer(use_bin_type=True)
+        parts = [packer.pack([ARTIFACT_FORMAT, self.detector_version])]
+        parts.extend(packer.pack(page.to_list()) for page in self.pages)
+        parts.append(packer.pack(trailer(self.page_count, self.findings)))
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> Optional["Analysis"]:
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(data)
+        header = next(unpacker, None)
+        if not isinstance(header, list) or header[0] != ARTIFACT_FORMAT:
+            return None
+        pages = []
+        for record in unpacker:
+            if isinstance(record, dict):
+                return cls(header[1], record["page_count"], pages,
+                           [FindingRecord(*finding) for finding in record["findings"]])
+            pages.append(PageRecord(*record))
+        raise ValueError("truncated analysis artifact")
+
+    @property
+    def has_words(self) -> bool:
+        return bool(self.pages) and all(page.words is not None for page in self.pages)
+
+    def lookup_rects(self, data_type: str, item: str) -> Optional[list]:
+        """
+        Rectangles for one item to redact, or None if detection never saw it.
+        Falls back to other types, since one value can be detected as several.
+        """
+        if self._by_value is None:
+            self._by_value = {}
+            for finding in self.findings:
+                by_type = self._by_value.setdefault(finding.value, {})
+                by_type.setdefault(finding.data_type, []).extend(finding.rects)
+        by_type = self._by_value.get(item)
+        if by_type is None:
+            return None
+        if data_type in by_type:
+            return by_type[data_type]
+        return next(iter(by_type.values()))
+
+    def locate_text(self, item: str) -> Optional[tuple]:
+        """
+        Where a typed item appears, from the recorded words: (page numbers
+        whose text layer contains it, [page, x0, y0, x1, y1] boxes of it in
+        OCR'd text). None when the words were not recorded.
+        """
+        if not self.has_words:
+            return None
+        needle = normalize_text(item)
+        if not needle:
+            return set(), []
+        pages = set()
+        ocr_rects = []
+        for page in self.pages:
+            layout, ocr_layout = page.layouts()
+            if needle in normalize_text(layout.text):
+                pages.add(page.number)
+            if ocr_layout is not None:
+                haystack = ocr_layout.text.lower()
+                start = haystack.find(item.lower())
+                while start != -1:
+                    for rect in ocr_layout.rects_for(start, start + len(item)):
+                        ocr_rects.append([page.number] + rect)
+                    start = haystack.find(item.lower(), start + 1)
+        return pages, ocr_rects
+
+    def item_pages(self) -> dict:
+        """{data_type: {value: [pages]}} for the report"""
+        pages = {}
+        for finding in self.findings:
+            found_on = pages.setdefault(finding.data_type, {}).setdefault(finding.value, [])
+            if finding.page not in found_on:
+                found_on.append(finding.page)
+        return pages
+
+    def summary(self) -> dict:
+        return {
+            "detector_version": self.detector_version,
+            "page_count": self.page_count,
+            "ocr_pages": [page.number for page in self.pages if page.ocr_used],
+            "findings": len(self.findings),
+            "pages_with_findings": len({finding.page for finding in self.findings})
+        }
+
+class AnalysisWriter:
+    """
+    Writes an artifact page by page to a temporary file in the store, so
+    a document's word geometry is never held in memory all at once.
+    finish() stores it; discard() drops it.
+    """
+
+    def __init__(self, sha256: str, detector_version: str):
+        self.sha256 = sha256
+        self.detector_version = detector_version
+        self.path = content_store.temp_path(".msgpack")
+        self.packer = msgpack.Packer(use_bin_type=True)
+        self.file = open(self.path, "wb")
+        self.file.write(self.packer.pack([ARTIFACT_FORMAT, detector_version]))
+
+    def add_page(self, page: PageRecord):
+        self.file.write(self.packer.pack(page.to_list()))
+
+    def finish(self, detection_result: dict):
+        self.file.write(self.packer.pack(
+            trailer(detection_result["debug_info"]["page_count"], finding_records(detection_result))
+        ))
+        self.file.close()
+        content_store.put_file(self.sha256, analysis_kind(self.detector_version), self.path)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def analysis_exists(sha256: str, detector_version: str) -> bool:
+    """Whether a current artifact is stored, from the store's index alone"""
+    return content_store.sha256_for(sha256, analysis_kind(detector_version)) is not None
+
+def save_analysis(sha256: str, analysis: Analysis):
+    """
+    Store the artifact under the document's content hash. It goes to the
+    blob backend like the document itself, not next to this node's local
+    copy of it, and is dropped along with the document's blob.
+    """
+    content_store.put_bytes(sha256, analysis_kind(analysis.detector_version), analysis.pack())
+
+def load_analysis(sha256: Optional[str], detector_version: str) -> Optional[Analysis]:
+    """Load the artifact detection stored with this detector version, if any"""
+    if sha256 is None:
+        return None
+    data = content_store.read_bytes(sha256, analysis_kind(detector_version))
+    if data is None:
+        return None
+    try:
+        analysis = Analysis.unpack(data)
+    except (ValueError, TypeError, KeyError, msgpack.UnpackException) as e:
+        logger.warning(f"Ignoring unreadable analysis artifact of {sha256}: {e}")
+        return None
+    if analysis is None or analysis.detector_version != detector_version:
+        return None
+    return analysis
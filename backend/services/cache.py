@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from contextlib import closing
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("DETECTION_CACHE_DIR", os.path.join("cache", "detections"))
+CACHE_PATH = os.path.join(CACHE_DIR, "detections.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("DETECTION_CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_BYTES = int(os.getenv("DETECTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(file_path: str) -> str:
+    """
+    SHA-256 of a file, read in fixed-size chunks
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class SqliteCache:
+    """
+    LRU cache of text values in a SQLite table, bounded by both entry
+    count and total size. Safe to share between the API process, uvicorn
+    workers and worker processes: the LRU order and the counters live in
+    the database, so every process sees the same entries and limits.
+    """
+    table = "entries"
+
+    def __init__(self, db_path: str, max_entries: int, max_bytes: int):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_lru ON {self.table} (last_used)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _count(self, conn, name: str):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,)
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(f"SELECT text FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self._count(conn, "misses")
+                    return None
+                conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._count(conn, "hits")
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"{self.table} cache lookup failed: {e}")
+            return None
+
+    def put(self, key: str, text: str):
+        size = len(text.encode())
+        if size > self.max_bytes:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, text, size, time.time())
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"{self.table} cache store failed: {e}")
+
+    def _evict(self, conn):
+        count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Drop the least recently used rows until both limits hold again
+        evicted = 0
+        for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_used").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            evicted += 1
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES ('evictions', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (evicted,)
+        )
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "entries": count,
+            "total_bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0
+        }
+
+class DetectionCache(SqliteCache):
+    """
+    Detection results keyed by document content, stored as JSON
+    """
+    table = "detections"
+
+    @staticmethod
+    def make_key(content_hash: str, *parts) -> str:
+        """Build a cache key from the content hash plus anything the result depends on"""
+        digest = hashlib.sha256(content_hash.encode())
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(json.dumps(part, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        text = super().get(key)
+        if text is None:
+            return None
+        try:
+            return json.loads(text)
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable detection cache entry {key}: {e}")
+            return None
+
+    def put(self, key: str, value: dict):
+        super().put(key, json.dumps(value))
+
+detection_cache = DetectionCache(CACHE_PATH, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join("cache", "ocr_pages.sqlite3"))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "20000"))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+def page_content_hash(page) -> str:
+    """
+    Hash everything that determines how a page renders: its content
+    stream(s), the raw bytes of its images, and its geometry.
+    """
+    doc = page.parent
+    digest = hashlib.sha256()
+    digest.update(f"{tuple(page.rect)}|{page.rotation}".encode())
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(b"\0")
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+class OcrPageCache(SqliteCache):
+    """
+    Tesseract output per rendered page, shared by the API process and
+    the OCR worker processes
+    """
+    table = "ocr_pages"
+
+    @staticmethod
+    def make_key(page, render, lang: str) -> str:
+        """Key a page by its rendered content, the render settings (matrix, DPI, ...) and the OCR language"""
+        return DetectionCache.make_key(page_content_hash(page), list(render), lang)
+
+ocr_page_cache = OcrPageCache(OCR_CACHE_PATH, OCR_CACHE_MAX_ENTRIES, OCR_CACHE_MAX_BYTES)
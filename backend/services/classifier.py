@@ -0,0 +1,119 @@
+import os
+import fitz  # PyMuPDF
+
+# Images smaller than this share of the page (logos, stamps, signatures)
+# are not worth OCR on their own
+MIN_IMAGE_FRACTION = float(os.getenv("OCR_MIN_IMAGE_FRACTION", "0.05"))
+# An image region whose area is at least this much covered by text-layer
+# words already has a text layer (e.g. a scan that was OCR'd before)
+TEXT_LAYER_COVERAGE = float(os.getenv("OCR_TEXT_LAYER_COVERAGE", "0.08"))
+
+class OcrDecision:
+    """
+    Whether a page needs OCR, which regions of it (unrotated page
+    coordinates), and why
+    """
+    __slots__ = ("needs_ocr", "reason", "regions", "image_coverage", "text_coverage")
+
+    def __init__(self, needs_ocr: bool, reason: str, regions: list = None,
+                 image_coverage: float = 0.0, text_coverage: float = 0.0):
+        self.needs_ocr = needs_ocr
+        self.reason = reason
+        self.regions = regions or []
+        self.image_coverage = image_coverage
+        self.text_coverage = text_coverage
+
+    def to_dict(self) -> dict:
+        return {
+            "needs_ocr": self.needs_ocr,
+            "reason": self.reason,
+            "regions": [[round(value, 1) for value in region] for region in self.regions],
+            "image_coverage": round(self.image_coverage, 3),
+            "text_coverage": round(self.text_coverage, 3)
+        }
+
+def _area(rect: fitz.Rect) -> float:
+    return 0.0 if rect.is_empty else rect.width * rect.height
+
+def unrotated_rect(page) -> fitz.Rect:
+    """
+    The page in unrotated coordinates, the ones image and text-layer
+    boxes use. page.rect is rotated: on a /Rotate 90 page it is landscape.
+    """
+    return page.rect * page.derotation_matrix
+
+def image_regions(page) -> tuple:
+    """
+    (regions, image coverage): the boxes of images large enough to OCR,
+    with small images that together cover a real share of the page (a
+    scan split into strips) merged into one region
+    """
+    if not page.get_images():
+        # get_image_info() interprets the whole content stream; the
+        # resource list is enough to tell a page without images
+        return [], 0.0
+    bounds = unrotated_rect(page)
+    page_area = _area(bounds) or 1.0
+    large = []
+    small = []
+    for info in page.get_image_info():
+        rect = fitz.Rect(info["bbox"]) & bounds
+        if rect.is_empty:
+            continue
+        (large if _area(rect) / page_area >= MIN_IMAGE_FRACTION else small).append(rect)
+
+    small_area = sum(_area(rect) for rect in small)
+    if small and small_area / page_area >= MIN_IMAGE_FRACTION:
+        merged = fitz.Rect()
+        for rect in small:
+            merged |= rect
+        large.append(merged)
+
+    coverage = min(sum(_area(rect) for rect in large) / page_area, 1.0)
+    return large, coverage
+
+def text_coverage(words: list, rect: fitz.Rect) -> float:
+    """Share of rect covered by words whose centre lies inside it"""
+    area = _area(rect)
+    if not area:
+        return 0.0
+    left, top, right, bottom = rect
+    covered = 0.0
+    for x0, y0, x1, y1, *_ in words:
+        # Plain comparisons: a fitz.Point per word costs more than the rest of the check
+        if left <= (x0 + x1) / 2 < right and top <= (y0 + y1) / 2 < bottom:
+            covered += (x1 - x0) * (y1 - y0)
+    return min(covered / area, 1.0)
+
+def classify_page(page, words: list) -> OcrDecision:
+    """
+    Decide from image and text-layer geometry whether a page needs OCR.
+    words are the page's text-layer words (see PageLayout). Only image
+    regions without a text layer are OCR'd, so a typed header over a
+    scanned body still gets its body read, while blank pages and short
+    text pages skip Tesseract.
+    """
+    regions, image_share = image_regions(page)
+    chars = sum(len(word[4]) for word in words)
+    page_text_share = text_coverage(words, unrotated_rect(page))
+
+    if not regions:
+        if chars:
+            reason = f"text layer only ({chars} characters, no large images)"
+        else:
+            reason = "blank page (no text, no large images)"
+        return OcrDecision(False, reason, image_coverage=image_share, text_coverage=page_text_share)
+
+    untexted = [region for region in regions if text_coverage(words, region) < TEXT_LAYER_COVERAGE]
+    if not untexted:
+        return OcrDecision(
+            False, f"{len(regions)} image region(s) already carry a text layer",
+            image_coverage=image_share, text_coverage=page_text_share
+        )
+
+    if not chars:
+        reason = f"scanned page (images cover {image_share:.0%}, no text layer)"
+    else:
+        reason = (f"text layer ({chars} characters) with {len(untexted)} of {len(regions)} "
+                  f"image region(s) lacking text")
+    return OcrDecision(True, reason, [tuple(region) for region in untexted], image_share, page_text_share)
@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import logging
+from typing import Iterable, Optional
+from services.validators import BANK_KEYWORDS, NORMALIZERS, VALIDATORS
+
+logger = logging.getLogger(__name__)
+
+# Optional JSON file with a list of rules shaped like DEFAULT_RULES. A rule
+# named like a built-in one overrides its fields ("enabled": false drops
+# it); other names add detectors. Read once, when the app starts.
+DETECTORS_CONFIG = os.getenv("DETECTORS_CONFIG", "")
+
+DEFAULT_RULES = [
+    {"name": "Aadhaar", "pattern": r'\b\d{4}\s?\d{4}\s?\d{4}\b',
+     "validator": "aadhaar", "normalizer": "as_is"},
+    {"name": "PAN", "pattern": r'\b[A-Z]{5}\d{4}[A-Z]{1}\b',
+     "validator": "pan", "normalizer": "upper"},
+    {"name": "Phone", "pattern": r'(\+91[\-\s]?)?[6-9]\d{9}\b',
+     "validator": "phone", "normalizer": "phone"},
+    {"name": "Email", "pattern": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+     "validator": "email", "normalizer": "lower"},
+    {"name": "Bank_Account", "pattern": r'\b\d{9,18}\b',
+     "validator": "bank_account", "normalizer": "digits", "keywords": list(BANK_KEYWORDS)},
+    {"name": "Credit_Debit_Card", "pattern": r'\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b',
+     "validator": "card", "normalizer": "as_is"},
+]
+
+class UnknownDetector(ValueError):
+    """A request named a detector that is not registered"""
+
+class Detector:
+    """
+    One kind of sensitive data: the pattern finding candidates, the
+    validator accepting them, the normalizer giving the reported value
+    and, optionally, keywords that must appear near a candidate
+    """
+    __slots__ = ("name", "pattern", "regex", "validator_name",
+                 "normalizer_name", "validate", "normalize", "keywords", "keyword_list")
+
+    def __init__(self, rule: dict):
+        self.name = rule["name"]
+        self.pattern = rule["pattern"]
+        try:
+            self.regex = re.compile(self.pattern)
+        except re.error as e:
+            raise RuntimeError(f"Detector '{self.name}': invalid pattern: {e}")
+        self.validator_name = rule.get("validator", "none")
+        self.normalizer_name = rule.get("normalizer", "as_is")
+        if self.validator_name not in VALIDATORS:
+            raise RuntimeError(f"Detector '{self.name}': unknown validator '{self.validator_name}', "
+                               f"expected one of {sorted(VALIDATORS)}")
+        if self.normalizer_name not in NORMALIZERS:
+            raise RuntimeError(f"Detector '{self.name}': unknown normalizer '{self.normalizer_name}', "
+                               f"expected one of {sorted(NORMALIZERS)}")
+        self.validate = VALIDATORS[self.validator_name]
+        self.normalize = NORMALIZERS[self.normalizer_name]
+        self.keyword_list = list(rule.get("keywords") or [])
+        self.keywords = (
+            re.compile("|".join(re.escape(keyword) for keyword in self.keyword_list), re.IGNORECASE)
+            if self.keyword_list else None
+        )
+
+    def describe(self) -> dict:
+        """The rule as configured; also what detection results depend on"""
+        return {
+            "name": self.name,
+            "pattern": self.pattern,
+            "validator": self.validator_name,
+            "normalizer": self.normalizer_name,
+            "keywords": self.keyword_list
+        }
+
+class DetectorRegistry:
+    """The configured detectors, in reporting order"""
+
+    def __init__(self, rules: list):
+        self.detectors = {}
+        for rule in rules:
+            detector = Detector(rule)
+            self.detectors[detector.name] = detector
+
+    @property
+    def names(self) -> list:
+        return list(self.detectors)
+
+    def select(self, names: Optional[Iterable[str]] = None) -> tuple:
+        """
+        The detectors to run, in registry order: all of them when names is
+        None, otherwise those named. Names may also be comma-separated.
+        """
+        if names is None:
+            return tuple(self.detectors.values())
+        wanted = {name.strip() for entry in names for name in entry.split(",") if name.strip()}
+        unknown = wanted - set(self.detectors)
+        if unknown:
+            raise UnknownDetector(f"Unknown detectors {sorted(unknown)}, expected some of {self.names}")
+        if not wanted:
+            raise UnknownDetector(f"No detectors selected, expected some of {self.names}")
+        return tuple(detector for name, detector in self.detectors.items() if name in wanted)
+
+def load_rules(config_path: str = "") -> list:
+    """DEFAULT_RULES merged with the rules in config_path, if given"""
+    rules = {rule["name"]: dict(rule) for rule in DEFAULT_RULES}
+    if not config_path:
+        return list(rules.values())
+
+    try:
+        with open(config_path) as f:
+            configured = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Could not read DETECTORS_CONFIG {config_path}: {e}")
+    if not isinstance(configured, list):
+        raise RuntimeError(f"DETECTORS_CONFIG {config_path} must hold a list of rules")
+
+    for rule in configured:
+        name = rule.get("name")
+        if not name:
+            raise RuntimeError(f"DETECTORS_CONFIG rule without a name: {rule}")
+        if rule.get("enabled", True) is False:
+            rules.pop(name, None)
+            continue
+        merged = dict(rules.get(name, {}))
+        merged.update((key, value) for key, value in rule.items() if key != "enabled")
+        if "pattern" not in merged:
+            raise RuntimeError(f"DETECTORS_CONFIG rule '{name}' needs a pattern")
+        rules[name] = merged
+    logger.info(f"Loaded detector rules from {config_path}: {list(rules)}")
+    return list(rules.values())
+
+registry = DetectorRegistry(load_rules(DETECTORS_CONFIG))
@@ -0,0 +1,194 @@
+import os
+import uuid
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Jobs of one type running at the same time
+JOB_CONCURRENCY = {
+    "detect": int(os.getenv("DETECT_JOB_WORKERS", "2")),
+    "redact": int(os.getenv("REDACT_JOB_WORKERS", "2")),
+    # A batch already fans out over its own process pool
+    "batch": int(os.getenv("BATCH_JOB_WORKERS", "1")),
+}
+# Jobs of one type waiting for a worker before submissions are refused
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+# Finished jobs kept for status polling
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "1000"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a job function once cancellation has been requested"""
+
+class QueueFull(Exception):
+    """Raised when a job type already has JOB_QUEUE_LIMIT jobs waiting"""
+
+class Job:
+    """
+    One unit of background work. The job function receives the Job and may
+    report progress and call check_cancelled() between steps.
+    """
+    __slots__ = ("id", "type", "status", "params", "progress", "result", "error",
+                 "created_at", "started_at", "finished_at", "future", "cancel_event")
+
+    def __init__(self, job_type: str, params: dict):
+        self.id = str(uuid.uuid4())
+        self.type = job_type
+        self.status = QUEUED
+        self.params = params
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.cancel_event = threading.Event()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def to_dict(self) -> dict:
+        info = {
+            "job_id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "params": self.params,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.started_at is not None:
+            info["queue_time"] = round(self.started_at - self.created_at, 4)
+            if self.finished_at is not None:
+                info["run_time"] = round(self.finished_at - self.started_at, 4)
+        if self.status == SUCCEEDED:
+            info["result"] = self.result
+        if self.error is not None:
+            info["error"] = self.error
+        return info
+
+class JobManager:
+    """
+    In-process job queue: one thread pool per job type, sized by
+    JOB_CONCURRENCY, so slow OCR-heavy detections cannot starve redactions.
+    """
+    def __init__(self, concurrency: dict):
+        self.concurrency = dict(concurrency)
+        self._executors = {}
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _executor(self, job_type: str) -> ThreadPoolExecutor:
+        if job_type not in self._executors:
+            self._executors[job_type] = ThreadPoolExecutor(
+                max_workers=max(self.concurrency.get(job_type, 1), 1),
+                thread_name_prefix=f"{job_type}-job"
+            )
+        return self._executors[job_type]
+
+    def submit(self, job_type: str, func: Callable, params: Optional[dict] = None, *args) -> Job:
+        """
+        Queue func(job, *args) and return its Job immediately
+        """
+        job = Job(job_type, params or {})
+        with self._lock:
+            waiting = sum(1 for j in self._jobs.values() if j.type == job_type and j.status == QUEUED)
+            if waiting >= JOB_QUEUE_LIMIT:
+                raise QueueFull(f"Too many queued {job_type} jobs ({waiting})")
+            self._jobs[job.id] = job
+            self._trim()
+            job.future = self._executor(job_type).submit(self._run, job, func, args)
+        logger.info(f"Queued {job_type} job {job.id}")
+        return job
+
+    def _run(self, job: Job, func: Callable, args: tuple):
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+        try:
+            job.check_cancelled()
+            job.result = func(job, *args)
+            job.status = SUCCEEDED
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            logger.error(f"{job.type} job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            logger.info(f"{job.type} job {job.id} {job.status} in {round(job.finished_at - job.started_at, 3)}s")
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond JOB_HISTORY"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(len(finished) - JOB_HISTORY, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, job_type: Optional[str] = None, status: Optional[str] = None) -> list:
+        with self._lock:
+            return [
+                job for job in self._jobs.values()
+                if (job_type is None or job.type == job_type) and (status is None or job.status == status)
+            ]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job: a queued job never starts, a running job stops at
+        its next check_cancelled(). Finished jobs are left as they are.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                job.future.cancel()
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        logger.info(f"Cancellation requested for {job.type} job {job_id}")
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                by_status = counts.setdefault(job.type, {})
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "concurrency": self.concurrency,
+            "queue_limit": JOB_QUEUE_LIMIT,
+            "jobs": counts
+        }
+
+    def shutdown(self):
+        """Cancel everything still queued and wait for running jobs"""
+        for job in self.list(status=QUEUED):
+            self.cancel(job.id)
+        for job in self.list(status=RUNNING):
+            job.cancel_event.set()
+        for executor in self._executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._executors.clear()
+
+job_manager = JobManager(JOB_CONCURRENCY)
@@ -0,0 +1,68 @@
+from bisect import bisect_right
+
+class PageLayout:
+    """
+    Page text rebuilt from positioned words, remembering where each word
+    starts in that text so text offsets can be mapped back to rectangles.
+    Words are tuples as returned by page.get_text("words"):
+    (x0, y0, x1, y1, text, block_no, line_no, word_no)
+    """
+    __slots__ = ("words", "starts", "text")
+
+    def __init__(self, words: list):
+        self.words = words
+        self.starts = []
+        parts = []
+        position = 0
+        previous_line = None
+        for word in words:
+            line = (word[5], word[6])
+            if parts:
+                # Words on one line are joined by a space, lines by a newline
+                parts.append(" " if line == previous_line else "\n")
+                position += 1
+            self.starts.append(position)
+            parts.append(word[4])
+            position += len(word[4])
+            previous_line = line
+        self.text = "".join(parts)
+
+    def rects_for(self, start: int, end: int) -> list:
+        """
+        Rectangles covering text[start:end], merged into one per line.
+        A partially covered word is cut proportionally, widened by half a
+        character on each cut side so no glyph is left showing.
+        """
+        rects = []
+        current_line = None
+        index = max(bisect_right(self.starts, start) - 1, 0)
+
+        while index < len(self.words) and self.starts[index] < end:
+            word = self.words[index]
+            word_start = self.starts[index]
+            word_length = len(word[4])
+            index += 1
+            if word_start + word_length <= start:
+                continue
+
+            x0, y0, x1, y1 = word[:4]
+            cut_start = max(start - word_start, 0)
+            cut_end = min(end - word_start, word_length)
+            if word_length and (cut_start > 0 or cut_end < word_length):
+                char_width = (x1 - x0) / word_length
+                left, right = x0, x1
+                if cut_start > 0:
+                    left = x0 + char_width * (cut_start - 0.5)
+                if cut_end < word_length:
+                    right = x0 + char_width * (cut_end + 0.5)
+                x0, x1 = max(left, x0), min(right, x1)
+
+            line = (word[5], word[6])
+            if line == current_line:
+                last = rects[-1]
+                rects[-1] = (min(last[0], x0), min(last[1], y0), max(last[2], x1), max(last[3], y1))
+            else:
+                rects.append((x0, y0, x1, y1))
+                current_line = line
+
+        return [[round(value, 2) for value in rect] for rect in rects]
@@ -0,0 +1,261 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+from services.cache import detection_cache, ocr_page_cache
+from services.ocr import ocr_pool
+from services.jobs import QUEUED, RUNNING, job_manager
+
+# Served at /metrics in the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "pdf_redactor_"
+
+# Bucket upper bounds (the +Inf bucket is implicit)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SIZE_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 2 * 1024 ** 2, 5 * 1024 ** 2,
+                10 * 1024 ** 2, 50 * 1024 ** 2)
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Metric:
+    """
+    Base of the metric types: a named family of samples, one per label set.
+    Metrics live in this process; worker processes keep their own.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.label_names)
+
+    def samples(self) -> list:
+        """[(suffix, label values, extra label, value), ...]"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [("_total", key, "", value) for key, value in sorted(self._values.items())]
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list:
+        with self._lock:
+            return [("", key, "", value) for key, value in sorted(self._values.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [count per bucket..., sum, count]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list:
+        with self._lock:
+            items = [(key, list(state)) for key, state in sorted(self._values.items())]
+        samples = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                samples.append(("_bucket", key, f'le="{_format_value(bound)}"', cumulative))
+            samples.append(("_sum", key, "", state[-2]))
+            samples.append(("_count", key, "", state[-1]))
+        return samples
+
+class CallbackGauge(Metric):
+    """A gauge whose samples are read from callback() ({label values: value}) at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 callback: Optional[Callable[[], dict]] = None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def samples(self) -> list:
+        if self.callback is None:
+            return []
+        return [("", key, "", value) for key, value in sorted(self.callback().items())]
+
+class CallbackCounter(CallbackGauge):
+    """Counts kept elsewhere (e.g. cache hit counters), read at scrape time"""
+    kind = "counter"
+
+    def samples(self) -> list:
+        return [("_total", key, extra, value) for _, key, extra, value in super().samples()]
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+registry = Registry()
+
+def counter(name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labels))
+
+def gauge(name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labels))
+
+def histogram(name: str, documentation: str, labels: Iterable[str] = (),
+              buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labels, buckets))
+
+def callback_gauge(name: str, documentation: str, labels: Iterable[str] = (),
+                   callback: Optional[Callable[[], dict]] = None) -> CallbackGauge:
+    return registry.register(CallbackGauge(name, documentation, labels, callback))
+
+def callback_counter(name: str, documentation: str, labels: Iterable[str] = (),
+                     callback: Optional[Callable[[], dict]] = None) -> CallbackCounter:
+    return registry.register(CallbackCounter(name, documentation, labels, callback))
+
+# Upload
+UPLOAD_BYTES = histogram("upload_bytes", "Size of uploaded PDFs", buckets=SIZE_BUCKETS)
+UPLOAD_SECONDS = histogram("upload_seconds", "Time to receive, check and store an upload")
+UPLOADS = counter("uploads", "Uploads by outcome (stored, duplicate, rejected, error)", ["outcome"])
+
+# Detection
+PAGE_EXTRACTION_SECONDS = histogram(
+    "page_extraction_seconds", "Text layer extraction time per page", buckets=FAST_BUCKETS
+)
+OCR_PAGE_SECONDS = histogram("ocr_page_seconds", "OCR time per page")
+OCR_FALLBACKS = counter(
+    "ocr_fallbacks", "Pages the page classifier sent to OCR, by outcome (used, empty, error)", ["outcome"]
+)
+DETECTION_SCAN_SECONDS = histogram(
+    "detection_scan_seconds", "Time of the regex scan of all selected patterns over one page window",
+    buckets=FAST_BUCKETS
+)
+DETECTION_VALIDATION_SECONDS = histogram(
+    "detection_validation_seconds",
+    "Time to validate and locate one detector's matches in one page window (not the regex scan)",
+    ["data_type"], buckets=FAST_BUCKETS
+)
+DETECTION_SECONDS = histogram("detection_seconds", "Time to detect a document", ["cache"])
+TIME_TO_FIRST_FINDING_SECONDS = histogram(
+    "time_to_first_finding_seconds",
+    "Time from a streamed detection request to its first finding, by where it came from (pages, cache)",
+    ["source"]
+)
+DETECTIONS = counter("detections", "Detections by result status", ["status"])
+
+# Redaction
+REDACTION_SECONDS = histogram("redaction_seconds", "Time to redact and save a document")
+REDACTION_SAVE_SECONDS = histogram("redaction_save_seconds", "Time spent writing the redacted PDF")
+REDACTION_OUTPUT_BYTES = histogram("redaction_output_bytes", "Size of redacted PDFs", buckets=SIZE_BUCKETS)
+REDACTION_BOXES = counter("redaction_boxes", "Redaction boxes applied")
+
+def _cache_lookups() -> dict:
+    counts = {}
+    for cache_name, cache in (("detection", detection_cache), ("ocr_page", ocr_page_cache)):
+        stats = cache.stats()
+        counts[(cache_name, "hit")] = stats["hits"]
+        counts[(cache_name, "miss")] = stats["misses"]
+    return counts
+
+def _jobs_in_flight() -> dict:
+    """{(type, status): jobs} for queued and running jobs, zeros included"""
+    counts = {(job_type, status): 0 for job_type in job_manager.concurrency for status in (QUEUED, RUNNING)}
+    for job in job_manager.list():
+        if job.status in (QUEUED, RUNNING):
+            counts[(job.type, job.status)] = counts.get((job.type, job.status), 0) + 1
+    return counts
+
+CACHE_LOOKUPS = callback_counter(
+    "cache_lookups", "Detection and OCR page cache lookups by result", ["cache", "result"], _cache_lookups
+)
+JOBS_IN_FLIGHT = callback_gauge("jobs_in_flight", "Background jobs queued or running", ["type", "status"],
+                                _jobs_in_flight)
+
+def _ocr_pool_workers() -> dict:
+    status = ocr_pool.status()
+    return {(): status["workers"] if status["running"] else 0}
+
+OCR_POOL_WORKERS = callback_gauge("ocr_pool_workers", "OCR worker processes in the running pool", [],
+                                  _ocr_pool_workers)
+OCR_POOL_RESTARTS = callback_counter("ocr_pool_restarts", "OCR pools replaced after a worker crashed", [],
+                                     lambda: {(): ocr_pool.restarts})
@@ -0,0 +1,326 @@
+import os
+import io
+import json
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+import fitz  # PyMuPDF
+from PIL import Image
+from services.cache import ocr_page_cache
+from services.classifier import unrotated_rect
+from services.ocr_engine import OCR_ENGINE, get_engine
+
+logger = logging.getLogger(__name__)
+
+# Number of OCR worker processes (0 or 1 runs OCR inline in the caller)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", min(4, os.cpu_count() or 1)))
+# Seconds to wait for a single page before giving up on it
+OCR_PAGE_TIMEOUT = float(os.getenv("OCR_PAGE_TIMEOUT", "120"))
+# Replace a worker after this many pages (0 keeps workers for good), in
+# case the engine leaks memory
+OCR_WORKER_MAX_PAGES = int(os.getenv("OCR_WORKER_MAX_PAGES", "0"))
+# Seconds a health check waits for the workers to answer
+OCR_HEALTH_TIMEOUT = float(os.getenv("OCR_HEALTH_TIMEOUT", "10"))
+
+OCR_ZOOM = 2  # Zoom factor for better quality
+OCR_LANG = "eng"
+
+# "adaptive": grayscale at a DPI matched to the page's images, cropped to
+# them when the page also has vector text. "fixed": 2x RGB, whole page.
+OCR_MODE = os.getenv("OCR_MODE", "adaptive")
+# Render resolution bounds for adaptive mode; pages without images use
+# the fixed mode's resolution (2x = 144 DPI)
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "300"))
+OCR_DEFAULT_DPI = 72 * OCR_ZOOM
+
+def image_dpi(page) -> Optional[int]:
+    """
+    Effective resolution of the sharpest image drawn on the page, or None
+    when there are no images
+    """
+    best = None
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"])
+        if bbox.is_empty or not info.get("width"):
+            continue
+        dpi = max(info["width"] / (bbox.width / 72), info["height"] / (bbox.height / 72))
+        best = dpi if best is None else max(best, dpi)
+    return round(best) if best is not None else None
+
+def image_area(page) -> Optional[fitz.Rect]:
+    """Union of the page's image boxes, clipped to the page, or None (unrotated coordinates)"""
+    bounds = unrotated_rect(page)
+    area = fitz.Rect()
+    for info in page.get_image_info():
+        area |= fitz.Rect(info["bbox"]) & bounds
+    return area if not area.is_empty else None
+
+def render_plan(page, has_text: bool, regions: Optional[list] = None) -> dict:
+    """
+    How to render a page for OCR. In adaptive mode the DPI follows the
+    embedded images (rendering above their resolution adds no detail), and
+    a page that already has some vector text is cropped to the regions
+    that need OCR (by default, all of its images). The clip is in
+    unrotated page coordinates, like the regions.
+    """
+    if OCR_MODE != "adaptive":
+        return {"mode": "fixed", "dpi": OCR_DEFAULT_DPI, "gray": False, "clip": None}
+    dpi = image_dpi(page)
+    dpi = OCR_DEFAULT_DPI if dpi is None else min(max(dpi, OCR_MIN_DPI), OCR_MAX_DPI)
+    clip = None
+    if has_text and regions:
+        clip = fitz.Rect()
+        for region in regions:
+            clip |= fitz.Rect(region)
+    elif has_text:
+        clip = image_area(page)
+    return {"mode": "adaptive", "dpi": dpi, "gray": True, "clip": clip}
+
+def render_for_ocr(page, plan: dict) -> tuple:
+    """
+    (image, matrix): the rendered page and the matrix taking its pixel
+    coordinates back to page coordinates, so OCR'd words can be boxed
+    """
+    if plan["mode"] == "fixed":
+        # Get the page as an image
+        pix = page.get_pixmap(matrix=fitz.Matrix(OCR_ZOOM, OCR_ZOOM))
+
+        # Convert to PIL Image
+        img_data = pix.tobytes("ppm")
+        img = Image.open(io.BytesIO(img_data))
+        scale = OCR_ZOOM
+    else:
+        # get_pixmap() clips in rotated page coordinates
+        clip = fitz.Rect(plan["clip"]) * page.rotation_matrix if plan["clip"] else None
+        pix = page.get_pixmap(dpi=plan["dpi"], colorspace=fitz.csGRAY, clip=clip, alpha=False)
+        # Hand the raw samples to PIL without encoding an image file
+        img = Image.frombytes("L", (pix.width, pix.height), pix.samples, "raw", "L", pix.stride)
+        scale = plan["dpi"] / 72
+
+    # Pixel (0, 0) sits at the pixmap origin (the clip's corner); undo the
+    # zoom, then the page rotation
+    to_page = fitz.Matrix(1, 0, 0, 1, pix.x, pix.y) * fitz.Matrix(1 / scale, 1 / scale) * page.derotation_matrix
+    return img, to_page
+
+def to_page_words(words: list, matrix: fitz.Matrix) -> list:
+    """OCR words in pixels -> words in page coordinates, as page.get_text("words") gives them"""
+    page_words = []
+    for x0, y0, x1, y1, *rest in words:
+        rect = fitz.Rect(x0, y0, x1, y1) * matrix
+        page_words.append((round(rect.x0, 2), round(rect.y0, 2), round(rect.x1, 2), round(rect.y1, 2), *rest))
+    return page_words
+
+def ocr_page(page, use_cache: bool = True, has_text: Optional[bool] = None,
+             regions: Optional[list] = None) -> list:
+    """
+    Render a page and run Tesseract on it, unless an identical page
+    has been OCR'd before. has_text says whether the page has any vector
+    text (looked up when not given); regions limits OCR to those boxes.
+    Returns the OCR'd words in page coordinates (see PageLayout).
+    """
+    if has_text is None:
+        has_text = bool(page.get_text().strip())
+    plan = render_plan(page, has_text, regions)
+
+    key = None
+    if use_cache:
+        try:
+            if plan["mode"] == "fixed":
+                render = list(fitz.Matrix(OCR_ZOOM, OCR_ZOOM))
+            else:
+                render = ["gray", plan["dpi"], list(plan["clip"]) if plan["clip"] else None]
+            # Entries hold words with boxes, not the plain text kept before
+            key = ocr_page_cache.make_key(page, render + ["words"], OCR_LANG)
+            cached = ocr_page_cache.get(key)
+            if cached is not None:
+                return [tuple(word) for word in json.loads(cached)]
+        except Exception as e:
+            logger.warning(f"Could not key page for the OCR cache: {e}")
+
+    img, to_page = render_for_ocr(page, plan)
+    words = to_page_words(get_engine(OCR_LANG).read_words(img), to_page)
+    if key is not None:
+        ocr_page_cache.put(key, json.dumps(words))
+    return words
+
+def ocr_document_page(file_path: str, page_index: int, has_text: Optional[bool] = None,
+                      regions: Optional[list] = None) -> tuple:
+    """
+    Worker entry point: open the document in this process and OCR one page.
+    Returns (words, seconds).
+    """
+    start = time.perf_counter()
+    with fitz.open(file_path) as doc:
+        words = ocr_page(doc[page_index], has_text=has_text, regions=regions)
+    return words, time.perf_counter() - start
+
+def init_worker():
+    """Load the engine when a worker starts, not on its first page"""
+    get_engine(OCR_LANG)
+
+def worker_status() -> dict:
+    """Health check run inside a worker"""
+    engine = get_engine(OCR_LANG)
+    return {"pid": os.getpid(), **engine.describe()}
+
+class OcrPool:
+    """
+    Long-lived OCR worker processes, each keeping its engine (and language
+    model) loaded between pages. A worker that dies breaks the executor;
+    the pool then starts a fresh one on the next submit or restart().
+    """
+
+    def __init__(self, workers: int, max_pages: int = 0):
+        self.workers = workers
+        self.max_pages = max_pages
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.started_at = None
+        self.restarts = 0
+        self.last_error = None
+        self.last_check = None
+        # Tasks submitted and not finished, and when one last finished (or
+        # the pool last went from idle to busy)
+        self.pending = 0
+        self.last_progress = None
+
+    def _current(self) -> tuple:
+        with self._lock:
+            if self._executor is None:
+                # Spawn instead of fork: the API process runs threads
+                options = {"max_tasks_per_child": self.max_pages} if self.max_pages > 0 else {}
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    **options
+                )
+                self._generation += 1
+                self.started_at = time.time()
+                logger.info(f"Started OCR pool with {self.workers} workers ({OCR_ENGINE} engine)")
+            return self._executor, self._generation
+
+    def submit(self, fn, *args):
+        """
+        Run fn(*args) in a worker. The returned future carries the pool
+        generation it ran in, for restart().
+        """
+        executor, generation = self._current()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool as e:
+            self.restart(generation, str(e) or "worker crashed")
+            executor, generation = self._current()
+            future = executor.submit(fn, *args)
+        future.pool_generation = generation
+        with self._lock:
+            if self.pending == 0:
+                self.last_progress = time.time()
+            self.pending += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.last_progress = time.time()
+
+    def restart(self, generation: int, reason: str):
+        """
+        Drop a broken executor. Every caller that saw the same crash passes
+        the same generation, so it is only replaced once.
+        """
+        with self._lock:
+            if self._executor is None or generation != self._generation:
+                return
+            executor = self._executor
+            self._executor = None
+            self.restarts += 1
+            self.last_error = reason
+        logger.error(f"OCR pool broken ({reason}), restarting")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def check(self, timeout: float = OCR_HEALTH_TIMEOUT) -> dict:
+        """
+        Ping every worker. A broken pool is restarted and checked again
+        once, so a crash shows up as a restart rather than an outage. The
+        pings queue behind pages already submitted, so a pool busy with
+        them counts as healthy while it keeps finishing pages.
+        """
+        with self._lock:
+            pending = self.pending
+        for attempt in range(2):
+            futures = [self.submit(worker_status) for _ in range(self.workers)]
+            done, not_done = wait(futures, timeout=timeout)
+            answers = []
+            broken = None
+            for future in done:
+                try:
+                    answers.append(future.result())
+                except BrokenProcessPool as e:
+                    broken = future.pool_generation, str(e) or "worker crashed"
+                except Exception as e:
+                    self.last_error = str(e)
+            if broken is not None and attempt == 0:
+                self.restart(*broken)
+                continue
+            break
+
+        for future in not_done:
+            future.cancel()
+        workers = {answer["pid"]: answer for answer in answers}
+        healthy = not not_done and broken is None and len(answers) == len(futures)
+        busy = (not healthy and broken is None and pending > 0
+                and time.time() - self.last_progress < OCR_PAGE_TIMEOUT)
+        self.last_check = {
+            "time": time.time(),
+            "healthy": healthy or busy,
+            "busy": busy,
+            "responding": len(workers),
+            "timed_out": len(not_done)
+        }
+        return {**self.status(), "workers_seen": sorted(workers.values(), key=lambda answer: answer["pid"])}
+
+    def status(self) -> dict:
+        with self._lock:
+            running = self._executor is not None
+        return {
+            "mode": "pool",
+            "engine": OCR_ENGINE,
+            "workers": self.workers,
+            "max_pages_per_worker": self.max_pages,
+            "running": running,
+            "pending": self.pending,
+            "started_at": self.started_at,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "last_check": self.last_check
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+ocr_pool = OcrPool(OCR_WORKERS, OCR_WORKER_MAX_PAGES)
+
+def get_ocr_pool() -> Optional[OcrPool]:
+    """
+    Return the shared OCR worker pool, or None when OCR should run inline
+    """
+    # Never nest pools inside worker processes
+    if OCR_WORKERS <= 1 or multiprocessing.parent_process() is not None:
+        return None
+    return ocr_pool
+
+def shutdown_ocr_pool():
+    """Stop the OCR worker processes"""
+    ocr_pool.shutdown()
@@ -0,0 +1,168 @@
+import io
+import os
+import logging
+import threading
+import subprocess
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# "tesserocr" keeps the Tesseract API (and its language model) loaded for
+# the life of the process; "cli" pipes each image through the tesseract
+# binary; "auto" uses tesserocr when it is installed
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", "tesseract")
+# Seconds the tesseract binary may take on one image
+TESSERACT_TIMEOUT = float(os.getenv("TESSERACT_TIMEOUT", "120"))
+
+def parse_tsv(tsv: str) -> list:
+    """
+    Words from Tesseract's TSV output, in reading order, as
+    (left, top, right, bottom, text, block, line, word) in image pixels.
+    line numbers every (block, paragraph, line) of the image in turn.
+    """
+    words = []
+    lines = {}
+    for row in tsv.splitlines()[1:]:
+        fields = row.split("\t")
+        if len(fields) < 12 or fields[0] != "5" or not fields[11].strip():
+            continue
+        block, paragraph, line, word = (int(value) for value in fields[2:6])
+        left, top, width, height = (int(value) for value in fields[6:10])
+        line_number = lines.setdefault((block, paragraph, line), len(lines))
+        words.append((left, top, left + width, top + height, fields[11].strip(), block, line_number, word))
+    return words
+
+class OcrEngine:
+    """
+    Turns an image into positioned words. One engine serves one thread at
+    a time, so callers get theirs from get_engine().
+    """
+    name = "base"
+
+    def __init__(self, lang: str):
+        self.lang = lang
+        self.pages = 0
+
+    def read_words(self, image: Image.Image) -> list:
+        """Words with their pixel boxes, see parse_tsv()"""
+        raise NotImplementedError
+
+    def version(self) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def describe(self) -> dict:
+        return {"engine": self.name, "lang": self.lang, "pages": self.pages}
+
+class TesserocrEngine(OcrEngine):
+    """
+    The Tesseract C++ API through tesserocr. The language model is loaded
+    once, when the engine is created, instead of once per page.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang: str):
+        super().__init__(lang)
+        try:
+            import tesserocr
+        except ImportError:
+            raise RuntimeError("OCR_ENGINE=tesserocr needs tesserocr (pip install tesserocr)")
+        self._tesserocr = tesserocr
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def read_words(self, image: Image.Image) -> list:
+        self.api.SetImage(image)
+        tsv = self.api.GetTSVText(0)
+        self.api.Clear()
+        self.pages += 1
+        # GetTSVText leaves out the header row the CLI writes
+        return parse_tsv("\n" + tsv)
+
+    def version(self) -> str:
+        return self._tesserocr.tesseract_version().splitlines()[0]
+
+    def close(self):
+        self.api.End()
+
+class CliEngine(OcrEngine):
+    """
+    The tesseract binary, fed the image on stdin and read from stdout, so
+    no temporary files are written. Still one process per page: the CLI
+    has no way to take a second image.
+    """
+    name = "cli"
+
+    def __init__(self, lang: str, cmd: str = TESSERACT_CMD):
+        super().__init__(lang)
+        self.cmd = cmd
+
+    def read_words(self, image: Image.Image) -> list:
+        # PNM needs no compression and Leptonica reads it from stdin
+        if image.mode not in ("1", "L", "RGB"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PPM")
+        result = subprocess.run(
+            [self.cmd, "stdin", "stdout", "-l", self.lang, "tsv"],
+            input=buffer.getvalue(), capture_output=True, timeout=TESSERACT_TIMEOUT
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"tesseract exited with {result.returncode}: "
+                               f"{result.stderr.decode(errors='replace').strip()}")
+        self.pages += 1
+        return parse_tsv(result.stdout.decode("utf-8", errors="replace"))
+
+    def version(self) -> str:
+        result = subprocess.run([self.cmd, "--version"], capture_output=True, timeout=30)
+        output = (result.stdout or result.stderr).decode(errors="replace")
+        return output.splitlines()[0] if output else "unknown"
+
+def engine_name(name: str) -> str:
+    """The engine an OCR_ENGINE value selects, with "auto" resolved"""
+    if name == "auto":
+        try:
+            import tesserocr  # noqa: F401
+            return "tesserocr"
+        except ImportError:
+            return "cli"
+    return name
+
+def check_engine():
+    """
+    Warn at startup when "auto" falls back to the tesseract binary, which
+    reloads the language model for every page
+    """
+    if OCR_ENGINE == "auto" and engine_name(OCR_ENGINE) == "cli":
+        logger.warning(
+            "tesserocr is not installed, so OCR starts the tesseract binary for every page and "
+            "reloads the language model each time. Install it (requirements.txt; it builds "
+            "against libtesseract-dev and libleptonica-dev) or set OCR_ENGINE=cli to accept this."
+        )
+
+def make_engine(name: str, lang: str) -> OcrEngine:
+    """Build the engine selected by OCR_ENGINE"""
+    name = engine_name(name)
+    if name == "tesserocr":
+        return TesserocrEngine(lang)
+    if name == "cli":
+        return CliEngine(lang)
+    raise RuntimeError(f"Unknown OCR_ENGINE '{name}', expected auto, tesserocr or cli")
+
+_local = threading.local()
+
+def get_engine(lang: str) -> OcrEngine:
+    """
+    This thread's engine, created on first use and then kept, so OCR worker
+    processes load the model once
+    """
+    engines = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    engine = engines.get(lang)
+    if engine is None:
+        engine = engines[lang] = make_engine(OCR_ENGINE, lang)
+        logger.info(f"Loaded {engine.name} OCR engine ({lang}) in process {os.getpid()}")
+    return engine
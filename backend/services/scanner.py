@@ -0,0 +1,54 @@
+from typing import NamedTuple, Optional
+from services.detectors import registry
+
+# Bump whenever extraction or validation changes what detection returns
+DETECTOR_VERSION = "8"
+
+# Patterns of the configured detectors, by name
+PATTERNS = {detector.name: detector.pattern for detector in registry.detectors.values()}
+
+class ScanMatch(NamedTuple):
+    """A raw pattern hit, with offsets into the scanned text"""
+    start: int
+    end: int
+    text: str
+
+class Scanner:
+    """
+    The scan for a set of detectors: one finditer per precompiled
+    pattern. In CPython this beats both a combined alternation and
+    cutting digit runs out of the text first, whose per-run Python work
+    costs more than re saves.
+    """
+
+    def __init__(self, detectors: tuple):
+        self.detectors = detectors
+
+    def scan(self, text: str) -> dict:
+        """Returns {name: [ScanMatch, ...]} in text order"""
+        found = {}
+        for detector in self.detectors:
+            matches = [ScanMatch(match.start(), match.end(), match.group(0))
+                       for match in detector.regex.finditer(text)]
+            if matches:
+                found[detector.name] = matches
+        return found
+
+_scanners = {}
+
+def get_scanner(detectors: Optional[tuple] = None) -> Scanner:
+    """The compiled scanner for a selection of detectors (all by default)"""
+    if detectors is None:
+        detectors = registry.select()
+    key = tuple(detector.name for detector in detectors)
+    scanner = _scanners.get(key)
+    if scanner is None:
+        scanner = _scanners[key] = Scanner(detectors)
+    return scanner
+
+def scan_text(text: str, detectors: Optional[tuple] = None) -> dict:
+    """
+    Find every pattern of the selected detectors (all by default) in the
+    text. Returns {name: [ScanMatch, ...]}.
+    """
+    return get_scanner(detectors).scan(text)
@@ -0,0 +1,443 @@
+import os
+import glob
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from typing import Iterator, Optional
+from services.cache import file_sha256
+from services.storage_backends import STORAGE_BACKEND, BlobBackend, iter_file_range, make_backend
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+# Metadata database: which blob each (file_id, kind) names, and refcounts.
+# It must be on a local disk: WAL mode keeps its index in shared memory,
+# which processes on different hosts cannot share, so a database on a
+# network filesystem is refused (see check_local_disk()). Several nodes
+# therefore cannot serve one store, even with an object-store backend.
+STORAGE_DB_PATH = os.getenv("STORAGE_DB_PATH", os.path.join(STORAGE_DIR, "storage.sqlite3"))
+# Files not read for this long are dropped by the GC
+STORAGE_TTL_SECONDS = int(os.getenv("STORAGE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Upper bound on blob bytes; the least recently used files go first
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", str(5 * 1024 * 1024 * 1024)))
+# Seconds between background GC runs (0 disables the thread)
+STORAGE_GC_INTERVAL = int(os.getenv("STORAGE_GC_INTERVAL", "600"))
+# last_access is only rewritten when older than this, to keep reads cheap
+ACCESS_RESOLUTION = 60
+# Leftover temporary files, and local copies of remote blobs, older than
+# this are removed by the GC
+TMP_MAX_AGE = 3600
+# Filesystem types (from /proc/mounts) SQLite's WAL mode does not work on
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "lustre",
+                       "fuse.sshfs", "fuse.glusterfs", "fuse.s3fs", "fuse.gcsfuse", "fuse.cephfs"}
+
+# Where each kind of file lived before the content-addressed store. They
+# are still read, so existing file_ids keep working until migrated.
+LEGACY_PATHS = {
+    "upload": os.path.join("uploads", "{file_id}.pdf"),
+    "redacted": os.path.join("redacted", "{file_id}_redacted.pdf"),
+    "report": os.path.join("redacted", "{file_id}_report.json"),
+    "batch_summary": os.path.join("redacted", "batch_{file_id}.json"),
+    "batch_archive": os.path.join("redacted", "batch_{file_id}.zip"),
+}
+
+def filesystem_type(path: str) -> Optional[str]:
+    """Type of the filesystem holding path, or None when it cannot be told (not Linux)"""
+    try:
+        with open("/proc/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+    path = os.path.realpath(path)
+    found = None
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        if path == mount_point or path.startswith(mount_point.rstrip("/") + "/"):
+            # The longest mount point wins; later mounts hide earlier ones at the same place
+            if found is None or len(mount_point) >= len(found[0]):
+                found = (mount_point, fs_type)
+    return found[1] if found is not None else None
+
+def check_local_disk(db_path: str):
+    """Refuse a WAL database on a network filesystem, where it would be corrupted"""
+    fs_type = filesystem_type(os.path.dirname(os.path.abspath(db_path)))
+    if fs_type in NETWORK_FILESYSTEMS:
+        raise RuntimeError(
+            f"STORAGE_DB_PATH {db_path} is on a {fs_type} filesystem; "
+            "SQLite in WAL mode needs a local disk"
+        )
+
+class ContentStore:
+    """
+    Content-addressed file storage. Blobs are stored once per SHA-256 in
+    a BlobBackend (local directory, object store, ...); (file_id, kind)
+    names such as an upload or its redacted copy point at a blob, and
+    blobs are reference counted so identical files share space. Metadata
+    lives in SQLite, so the API process and worker processes can share
+    the store. That index is local to one host: deployment is single-node,
+    whichever backend holds the blobs.
+    """
+
+    def __init__(self, root: str, ttl_seconds: int, quota_bytes: int,
+                 backend: BlobBackend, db_path: Optional[str] = None):
+        self.root = root
+        self.backend = backend
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.db_path = db_path or os.path.join(root, "storage.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self._initialized = False
+        self._gc_thread = None
+        self._gc_stop = threading.Event()
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            check_local_disk(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                "refcount INTEGER NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "file_id TEXT NOT NULL, kind TEXT NOT NULL, sha256 TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL, "
+                "PRIMARY KEY (file_id, kind))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_lru ON files (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL)"
+            )
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _count(self, conn, name: str, amount: float = 1):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount)
+        )
+
+    def temp_path(self, suffix: str = "") -> str:
+        """A fresh path on the store's filesystem, for files about to be put()"""
+        self._connect().close()
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4()}{suffix}")
+
+    def put_file(self, file_id: str, kind: str, src_path: str, sha256: Optional[str] = None) -> dict:
+        """
+        Move src_path into the store as (file_id, kind). If a blob with the
+        same content exists, src_path is dropped and the blob is shared.
+        """
+        sha256 = sha256 or file_sha256(src_path)
+        size = os.path.getsize(src_path)
+        now = time.time()
+
+        # Upload before taking the write lock, so a slow backend does not
+        # hold up every other writer; the transaction only records it
+        with closing(self._connect()) as conn:
+            known = conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        duplicate = known is not None and self.backend.exists(sha256)
+        if not duplicate:
+            self.backend.put(sha256, src_path)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT refcount FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None and duplicate:
+                # Its last reference went in the meantime, taking the blob along
+                self.backend.put(sha256, src_path)
+                duplicate = False
+            if row is not None:
+                conn.execute("UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?", (sha256,))
+            else:
+                conn.execute(
+                    "INSERT INTO blobs (sha256, size, refcount, created_at) VALUES (?, ?, 1, ?)",
+                    (sha256, size, now)
+                )
+            if duplicate:
+                self._count(conn, "dedup_hits")
+
+            old = conn.execute(
+                "SELECT sha256 FROM files WHERE file_id = ? AND kind = ?", (file_id, kind)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, kind, sha256, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (file_id, kind, sha256, size, now, now)
+            )
+            if old is not None:
+                self._release(conn, old[0])
+
+        if duplicate:
+            os.remove(src_path)
+        return {"sha256": sha256, "size": size, "duplicate": duplicate}
+
+    def put_bytes(self, file_id: str, kind: str, data: bytes) -> dict:
+        tmp_path = self.temp_path()
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return self.put_file(file_id, kind, tmp_path)
+
+    def _lookup(self, file_id: str, kind: str) -> Optional[tuple]:
+        """(sha256, size, created_at) of a stored file, refreshing its last access"""
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT sha256, size, created_at, last_access FROM files WHERE file_id = ? AND kind = ?",
+                    (file_id, kind)
+                ).fetchone()
+                if row is not None and now - row[3] > ACCESS_RESOLUTION:
+                    conn.execute(
+                        "UPDATE files SET last_access = ? WHERE file_id = ? AND kind = ?", (now, file_id, kind)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Storage lookup failed for {file_id}/{kind}: {e}")
+            return None
+        return row[:3] if row is not None else None
+
+    def _legacy_path(self, file_id: str, kind: str) -> Optional[str]:
+        legacy = LEGACY_PATHS.get(kind)
+        if legacy is not None:
+            path = legacy.format(file_id=file_id)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def path_for(self, file_id: str, kind: str) -> Optional[str]:
+        """
+        Local, readable path of (file_id, kind), or None. Falls back to the
+        pre-store location for files that were never migrated.
+        """
+        row = self._lookup(file_id, kind)
+        if row is not None:
+            return self.backend.local_path(row[0])
+        return self._legacy_path(file_id, kind)
+
+    def size_for(self, file_id: str, kind: str) -> Optional[int]:
+        """Size in bytes of (file_id, kind), without touching the blob"""
+        row = self._lookup(file_id, kind)
+        if row is not None:
+            return row[1]
+        path = self._legacy_path(file_id, kind)
+        return os.path.getsize(path) if path is not None else None
+
+    def sha256_for(self, file_id: str, kind: str) -> Optional[str]:
+        row = self._lookup(file_id, kind)
+        return row[0] if row is not None else None
+
+    def stat(self, file_id: str, kind: str) -> Optional[dict]:
+        """
+        Metadata of (file_id, kind) from the index: sha256, size, created_at
+        and path, a local copy that can be sent without a download (or None)
+        """
+        row = self._lookup(file_id, kind)
+        if row is not None:
+            return {"sha256": row[0], "size": row[1], "created_at": row[2],
+                    "path": self.backend.cached_copy(row[0])}
+        path = self._legacy_path(file_id, kind)
+        if path is None:
+            return None
+        return {"sha256": None, "size": os.path.getsize(path), "created_at": os.path.getmtime(path), "path": path}
+
+    def stat_many(self, file_id: str, kinds: list) -> dict:
+        """{kind: {"sha256", "size", "created_at"}} for the stored kinds of a file_id, in one query"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT kind, sha256, size, created_at FROM files WHERE file_id = ?", (file_id,)
+            ).fetchall()
+        found = {
+            kind: {"sha256": sha256, "size": size, "created_at": created_at}
+            for kind, sha256, size, created_at in rows if kind in kinds
+        }
+        for kind in kinds:
+            path = None if kind in found else self._legacy_path(file_id, kind)
+            if path is not None:
+                found[kind] = {"sha256": None, "size": os.path.getsize(path), "created_at": os.path.getmtime(path)}
+        return found
+
+    def iter_bytes(self, file_id: str, kind: str, start: int = 0, end: Optional[int] = None) -> Optional[Iterator[bytes]]:
+        """
+        Stream bytes start..end (inclusive) of (file_id, kind) straight from
+        the backend, or None if there is no such file
+        """
+        row = self._lookup(file_id, kind)
+        if row is not None:
+            return self.backend.iter_range(row[0], start, end)
+        path = self._legacy_path(file_id, kind)
+        return iter_file_range(path, start, end) if path is not None else None
+
+    def delete(self, file_id: str, kind: Optional[str] = None) -> int:
+        """Forget one or all kinds of a file_id; returns how many were removed"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if kind is None:
+                rows = conn.execute("SELECT kind, sha256 FROM files WHERE file_id = ?", (file_id,)).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT kind, sha256 FROM files WHERE file_id = ? AND kind = ?", (file_id, kind)
+                ).fetchall()
+            for row_kind, sha256 in rows:
+                conn.execute("DELETE FROM files WHERE file_id = ? AND kind = ?", (file_id, row_kind))
+                self._release(conn, sha256)
+        return len(rows)
+
+    def read_bytes(self, file_id: str, kind: str) -> Optional[bytes]:
+        """Whole content of a small stored file (reports, summaries)"""
+        stream = self.iter_bytes(file_id, kind)
+        return b"".join(stream) if stream is not None else None
+
+    def _release(self, conn, sha256: str):
+        """Drop one reference to a blob, deleting it with the last one"""
+        conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (sha256,))
+        row = conn.execute("SELECT refcount, size FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None or row[0] > 0:
+            return
+        conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+        # The blob and its local copies
+        self.backend.delete(sha256)
+        # Files derived from a blob (e.g. its analysis artifact) are stored under its hash
+        for kind, derived in conn.execute("SELECT kind, sha256 FROM files WHERE file_id = ?", (sha256,)).fetchall():
+            conn.execute("DELETE FROM files WHERE file_id = ? AND kind = ?", (sha256, kind))
+            self._release(conn, derived)
+        self._count(conn, "blobs_removed")
+        self._count(conn, "bytes_freed", row[1])
+
+    def gc(self) -> dict:
+        """
+        Drop files unread for longer than the TTL, then the least recently
+        read files until the blobs fit in the quota
+        """
+        start = time.time()
+        expired = evicted = 0
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for file_id, kind, sha256 in conn.execute(
+                "SELECT file_id, kind, sha256 FROM files WHERE last_access < ?", (start - self.ttl_seconds,)
+            ).fetchall():
+                conn.execute("DELETE FROM files WHERE file_id = ? AND kind = ?", (file_id, kind))
+                self._release(conn, sha256)
+                expired += 1
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total > self.quota_bytes:
+                for file_id, kind, sha256 in conn.execute(
+                    "SELECT file_id, kind, sha256 FROM files ORDER BY last_access"
+                ).fetchall():
+                    if total <= self.quota_bytes:
+                        break
+                    conn.execute("DELETE FROM files WHERE file_id = ? AND kind = ?", (file_id, kind))
+                    self._release(conn, sha256)
+                    evicted += 1
+                    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+            self._count(conn, "gc_runs")
+            self._count(conn, "expired", expired)
+            self._count(conn, "evicted", evicted)
+            conn.execute(
+                "INSERT OR REPLACE INTO counters (name, value) VALUES ('last_gc', ?)", (start,)
+            )
+
+        self.backend.evict_cache(TMP_MAX_AGE)
+        # Temporary files left behind by interrupted requests
+        for name in os.listdir(self.tmp_dir):
+            path = os.path.join(self.tmp_dir, name)
+            try:
+                if start - os.path.getmtime(path) > TMP_MAX_AGE:
+                    os.remove(path)
+            except OSError:
+                pass
+
+        result = {"expired": expired, "evicted": evicted, "seconds": round(time.time() - start, 4)}
+        if expired or evicted:
+            logger.info(f"Storage GC: {result}")
+        return result
+
+    def migrate_legacy(self) -> dict:
+        """Move files from the pre-store locations into the store"""
+        migrated = {}
+        for kind, pattern in LEGACY_PATHS.items():
+            prefix, suffix = pattern.split("{file_id}")
+            for path in glob.glob(f"{prefix}*{suffix}"):
+                file_id = path[len(prefix):len(path) - len(suffix)]
+                # "<id>_redacted.pdf" also matches "<id>.pdf" style patterns
+                if not file_id or any(c in file_id for c in "_."):
+                    continue
+                tmp_path = self.temp_path()
+                os.replace(path, tmp_path)
+                self.put_file(file_id, kind, tmp_path)
+                migrated[kind] = migrated.get(kind, 0) + 1
+        logger.info(f"Migrated legacy files: {migrated}")
+        return migrated
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            blob_count, blob_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+            by_kind = {
+                kind: {"files": count, "bytes": total}
+                for kind, count, total in conn.execute(
+                    "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM files GROUP BY kind"
+                ).fetchall()
+            }
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        file_count = sum(kind["files"] for kind in by_kind.values())
+        logical_bytes = sum(kind["bytes"] for kind in by_kind.values())
+        return {
+            "blobs": blob_count,
+            "files": file_count,
+            "used_bytes": blob_bytes,
+            "logical_bytes": logical_bytes,
+            "saved_bytes": logical_bytes - blob_bytes,
+            "dedup_ratio": round(logical_bytes / blob_bytes, 3) if blob_bytes else 1.0,
+            "by_kind": by_kind,
+            "quota_bytes": self.quota_bytes,
+            "quota_used": round(blob_bytes / self.quota_bytes, 4) if self.quota_bytes else None,
+            "ttl_seconds": self.ttl_seconds,
+            "backend": self.backend.describe(),
+            "dedup_hits": int(counters.get("dedup_hits", 0)),
+            "gc": {
+                "runs": int(counters.get("gc_runs", 0)),
+                "last_run": counters.get("last_gc"),
+                "expired": int(counters.get("expired", 0)),
+                "evicted": int(counters.get("evicted", 0)),
+                "blobs_removed": int(counters.get("blobs_removed", 0)),
+                "bytes_freed": int(counters.get("bytes_freed", 0)),
+            }
+        }
+
+    def start_gc(self, interval: int = STORAGE_GC_INTERVAL):
+        """Run gc() every interval seconds in a daemon thread"""
+        if interval <= 0 or self._gc_thread is not None:
+            return
+        self._gc_stop.clear()
+
+        def loop():
+            while not self._gc_stop.wait(interval):
+                try:
+                    self.gc()
+                except Exception as e:
+                    logger.error(f"Storage GC failed: {e}")
+
+        self._gc_thread = threading.Thread(target=loop, name="storage-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self):
+        if self._gc_thread is not None:
+            self._gc_stop.set()
+            self._gc_thread.join(timeout=5)
+            self._gc_thread = None
+
+content_store = ContentStore(
+    STORAGE_DIR, STORAGE_TTL_SECONDS, STORAGE_QUOTA_BYTES,
+    make_backend(STORAGE_BACKEND, STORAGE_DIR), STORAGE_DB_PATH
+)
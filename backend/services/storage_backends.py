@@ -0,0 +1,273 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+# Object-store settings (STORAGE_BACKEND=s3); the endpoint may be MinIO
+S3_BUCKET = os.getenv("STORAGE_S3_BUCKET", "")
+S3_PREFIX = os.getenv("STORAGE_S3_PREFIX", "blobs/")
+S3_ENDPOINT = os.getenv("STORAGE_S3_ENDPOINT") or None
+S3_REGION = os.getenv("STORAGE_S3_REGION") or None
+S3_MAX_CONNECTIONS = int(os.getenv("STORAGE_S3_MAX_CONNECTIONS", "16"))
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+def sharded(root: str, key: str) -> str:
+    return os.path.join(root, key[:2], key)
+
+class BlobBackend:
+    """
+    Where blob bytes live. Keys are content hashes. PyMuPDF needs a real
+    file, so local_path() gives one; backends that are not a local
+    directory download the blob into cache_dir on first use.
+    """
+    name = "base"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def put(self, key: str, src_path: str):
+        """Store the file at src_path under key; src_path is consumed"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Stream bytes start..end (inclusive) of a blob in chunks"""
+        raise NotImplementedError
+
+    def _download(self, key: str, dest_path: str):
+        raise NotImplementedError
+
+    def cached_path(self, key: str) -> str:
+        """Local path a blob is (or would be) read from"""
+        return sharded(self.cache_dir, key)
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self.cached_path(key)
+        if os.path.exists(path):
+            os.utime(path)  # remembered for evict_cache()
+            return path
+        if not self.exists(key):
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4()}.part"
+        try:
+            self._download(key, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def cached_copy(self, key: str) -> Optional[str]:
+        """Local path of a blob if it can be read without a download"""
+        path = self.cached_path(key)
+        return path if os.path.exists(path) else None
+
+    def drop_cached(self, key: str):
+        """Remove the local copy of a blob and anything derived from it"""
+        path = self.cached_path(key)
+        directory = os.path.dirname(path)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith(key):
+                    try:
+                        os.remove(os.path.join(directory, name))
+                    except FileNotFoundError:
+                        pass
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass  # other blobs share the directory
+
+    def evict_cache(self, max_age: float) -> int:
+        """Drop local copies not read for max_age seconds"""
+        return 0
+
+    def describe(self) -> dict:
+        return {"backend": self.name}
+
+class LocalBackend(BlobBackend):
+    """Blobs as files in a local (or shared network) directory"""
+    name = "local"
+
+    def put(self, key: str, src_path: str):
+        path = sharded(self.cache_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src_path, path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(sharded(self.cache_dir, key))
+
+    def delete(self, key: str):
+        self.drop_cached(key)
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        yield from iter_file_range(sharded(self.cache_dir, key), start, end)
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = sharded(self.cache_dir, key)
+        return path if os.path.exists(path) else None
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "directory": self.cache_dir}
+
+class RemoteBackend(BlobBackend):
+    """Shared behaviour of backends that keep a local read cache"""
+
+    def evict_cache(self, max_age: float) -> int:
+        removed = 0
+        now = time.time()
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    if now - os.path.getmtime(path) > max_age:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+class MemoryBackend(RemoteBackend):
+    """
+    In-process object store. Behaves like a remote backend (blobs are
+    only readable through the cache), which makes it a test stand-in for S3.
+    Objects are not shared with worker processes, so use BATCH_WORKERS=1.
+    """
+    name = "memory"
+
+    def __init__(self, cache_dir: str):
+        super().__init__(cache_dir)
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, src_path: str):
+        with open(src_path, "rb") as f:
+            data = f.read()
+        os.remove(src_path)
+        with self._lock:
+            self._objects[key] = data
+
+    def exists(self, key: str) -> bool:
+        return key in self._objects
+
+    def delete(self, key: str):
+        with self._lock:
+            self._objects.pop(key, None)
+        self.drop_cached(key)
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        data = self._objects[key]
+        stop = len(data) if end is None else min(end + 1, len(data))
+        for offset in range(start, stop, STREAM_CHUNK_SIZE):
+            yield data[offset:min(offset + STREAM_CHUNK_SIZE, stop)]
+
+    def _download(self, key: str, dest_path: str):
+        with open(dest_path, "wb") as f:
+            f.write(self._objects[key])
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "objects": len(self._objects)}
+
+class S3Backend(RemoteBackend):
+    """
+    S3-compatible object store (AWS, MinIO, ...) through boto3. One client
+    is shared by all threads, with a pool of up to max_connections. The
+    bucket is for one node's store: the index of what it holds is that
+    node's SQLite database.
+    """
+    name = "s3"
+
+    def __init__(self, cache_dir: str, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, max_connections: int = S3_MAX_CONNECTIONS):
+        super().__init__(cache_dir)
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs STORAGE_S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self._client_error = ClientError
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(max_pool_connections=max_connections, retries={"max_attempts": 3, "mode": "standard"})
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _head(self, key: str) -> Optional[dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put(self, key: str, src_path: str):
+        # upload_file streams from disk, switching to multipart for large files
+        self.client.upload_file(src_path, self.bucket, self._key(key))
+        os.remove(src_path)
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        self.drop_cached(key)
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key), Range=byte_range)
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(STREAM_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def _download(self, key: str, dest_path: str):
+        self.client.download_file(self.bucket, self._key(key), dest_path)
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "bucket": self.bucket, "prefix": self.prefix, "endpoint": self.endpoint_url}
+
+def iter_file_range(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Stream bytes start..end (inclusive) of a local file in chunks"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def make_backend(name: str, root: str) -> BlobBackend:
+    """Build the backend selected by STORAGE_BACKEND"""
+    if name == "local":
+        return LocalBackend(os.path.join(root, "blobs"))
+    if name == "memory":
+        return MemoryBackend(os.path.join(root, "cache"))
+    if name == "s3":
+        return S3Backend(os.path.join(root, "cache"), S3_BUCKET, S3_PREFIX, S3_ENDPOINT, S3_REGION)
+    raise RuntimeError(f"Unknown STORAGE_BACKEND '{name}', expected local, memory or s3")
@@ -0,0 +1,164 @@
+import os
+import re
+
+# Reject Aadhaar numbers failing the Verhoeff check and cards failing Luhn.
+# Turn off (DETECT_CHECKSUMS=0) for demo documents with made-up numbers.
+CHECKSUMS = os.getenv("DETECT_CHECKSUMS", "1") != "0"
+
+# Words near a digit run that mark it as a bank account number
+BANK_KEYWORDS = ("acc", "a/c", "bank", "savings", "current", "ifsc", "branch", "overdraft")
+
+PAN_RE = re.compile(r'[A-Z]{5}\d{4}[A-Z]')
+EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}')
+
+# str.translate tables: cheaper than re.sub for dropping separators
+_DROP_SPACES = str.maketrans("", "", " \t\n\r\f\v")
+_DROP_SPACES_DASHES = str.maketrans("", "", " \t\n\r\f\v-")
+_DROP_PHONE_SEPARATORS = str.maketrans("", "", " \t\n\r\f\v-+")
+
+# Verhoeff tables: multiplication in the dihedral group D5, the position
+# permutation and the inverse
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6), (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4), (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2), (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+_VERHOEFF_INV = (0, 4, 3, 2, 1, 5, 6, 7, 8, 9)
+
+def _verhoeff(digits: str) -> int:
+    check = 0
+    for position, digit in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[position % 8][ord(digit) - 48]]
+    return check
+
+def verhoeff_valid(digits: str) -> bool:
+    """Verhoeff check (used by Aadhaar) over a string of digits, check digit last"""
+    return _verhoeff(digits) == 0
+
+def verhoeff_check_digit(digits: str) -> str:
+    """The digit to append to digits so the result passes verhoeff_valid()"""
+    return str(_VERHOEFF_INV[_verhoeff(digits + "0")])
+
+def luhn_valid(digits: str) -> bool:
+    """Luhn check (used by payment cards) over a string of digits, check digit last"""
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        value = ord(digit) - 48
+        if position % 2:
+            value = value * 2 - 9 if value > 4 else value * 2
+        total += value
+    return total % 10 == 0
+
+def luhn_check_digit(digits: str) -> str:
+    """The digit to append to digits so the result passes luhn_valid()"""
+    for check in "0123456789":
+        if luhn_valid(digits + check):
+            return check
+    raise ValueError(f"Not a digit string: {digits!r}")
+
+def is_likely_aadhaar(text: str) -> bool:
+    """
+    Determine if a numeric string is likely an Aadhaar number
+    """
+    digits = text.translate(_DROP_SPACES)
+    # Aadhaar is exactly 12 digits, doesn't start with 0 or 1 and ends in a Verhoeff check digit
+    return (len(digits) == 12 and digits.isdigit() and digits[0] not in "01"
+            and (not CHECKSUMS or verhoeff_valid(digits)))
+
+def is_likely_credit_card(text: str) -> bool:
+    """
+    Determine if a numeric string is likely a credit card
+    """
+    digits = text.translate(_DROP_SPACES_DASHES)
+    # 16 digits with a Visa, Mastercard or Discover/RuPay prefix and a Luhn check digit
+    return (len(digits) == 16 and digits.isdigit() and digits[0] in "456"
+            and (not CHECKSUMS or luhn_valid(digits)))
+
+def is_likely_phone_number(text: str) -> bool:
+    """
+    Determine if a numeric string is likely a phone number
+    """
+    digits = text.translate(_DROP_PHONE_SEPARATORS)
+    if not digits.isdigit():
+        return False
+    # Indian phone numbers start with 6,7,8,9 and are 10 digits, 12 with the country code
+    if len(digits) == 10:
+        return digits[0] in "6789"
+    return len(digits) == 12 and digits.startswith("91") and digits[2] in "6789"
+
+def is_bank_account_number(text: str) -> bool:
+    """
+    9 to 18 digits. Whether it is an account number depends on the words
+    around it (see BANK_KEYWORDS), which the bank account detector checks.
+    """
+    digits = text.translate(_DROP_SPACES_DASHES)
+    return 9 <= len(digits) <= 18 and digits.isdigit()
+
+def is_likely_pan(text: str) -> bool:
+    """
+    Determine if a string is likely a PAN number
+    """
+    # PAN format: 5 letters, 4 digits, 1 letter
+    return len(text) == 10 and PAN_RE.fullmatch(text) is not None
+
+def is_email(text: str) -> bool:
+    return EMAIL_RE.fullmatch(text) is not None
+
+def phone_digits(text: str) -> str:
+    """Phone numbers formatted consistently: 10 digits, without the country code"""
+    digits = text.translate(_DROP_PHONE_SEPARATORS)
+    return digits[2:] if len(digits) == 12 else digits
+
+def strip_separators(text: str) -> str:
+    return text.translate(_DROP_SPACES_DASHES)
+
+# Names detector rules use for their validator and normalizer
+VALIDATORS = {
+    "aadhaar": is_likely_aadhaar,
+    "pan": is_likely_pan,
+    "phone": is_likely_phone_number,
+    "email": is_email,
+    "bank_account": is_bank_account_number,
+    "card": is_likely_credit_card,
+    "none": lambda text: True,
+}
+NORMALIZERS = {
+    "as_is": lambda text: text,
+    "upper": str.upper,
+    "lower": str.lower,
+    "phone": phone_digits,
+    "digits": strip_separators,
+}
+
+def validate_matches(text: str, matches: list, detector, context_chars: int) -> list:
+    """
+    Validate all of one detector's scanner matches over text together.
+    Returns [(match, normalized value)] for those accepted, in order.
+
+    Values repeat a lot in statements (the same account or card on every
+    page), so each distinct candidate is checked once per batch. Detectors
+    with context keywords (bank accounts) look for them in place, around
+    candidates that pass the other checks.
+    """
+    accepted = []
+    verdicts = {}
+    keywords = detector.keywords
+    for match in matches:
+        value = verdicts.get(match.text, verdicts)
+        if value is verdicts:
+            value = verdicts[match.text] = detector.normalize(match.text) if detector.validate(match.text) else None
+        if value is None:
+            continue
+        if keywords is not None and not keywords.search(
+                text, max(0, match.start - context_chars), match.end + context_chars):
+            continue
+        accepted.append((match, value))
+    return accepted
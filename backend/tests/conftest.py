@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Keep the stores and caches of a test run out of the working directory.
+# Set before any service module is imported, since they read these at import.
+_scratch = tempfile.mkdtemp(prefix="pdf-redactor-tests-")
+os.environ.setdefault("STORAGE_DIR", os.path.join(_scratch, "storage"))
+os.environ.setdefault("DETECTION_CACHE_DIR", os.path.join(_scratch, "cache"))
+os.environ.setdefault("OCR_CACHE_PATH", os.path.join(_scratch, "ocr_pages.sqlite3"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
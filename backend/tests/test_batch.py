@@ -0,0 +1,70 @@
+import io
+import os
+import zipfile
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from routers import batch
+
+def pdf_bytes(text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def zip_bytes(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_WORKERS", 1)
+    with TestClient(app) as client:
+        yield client
+
+def test_batch_reads_pdfs_and_zip_entries(client):
+    archive = zip_bytes({"a.pdf": pdf_bytes("Email: a@example.com"), "notes.txt": b"skipped",
+                         "b.pdf": b"not a pdf"})
+    response = client.post("/batch/?redact=false", files=[
+        ("files", ("c.pdf", pdf_bytes("Email: c@example.com"), "application/pdf")),
+        ("files", ("docs.zip", archive, "application/zip")),
+    ])
+    assert response.status_code == 200
+    documents = {document["filename"]: document for document in response.json()["documents"]}
+    assert set(documents) == {"a.pdf", "b.pdf", "c.pdf"}
+    assert documents["a.pdf"]["detected_data"]["Email"] == ["a@example.com"]
+    assert documents["c.pdf"]["detected_data"]["Email"] == ["c@example.com"]
+    assert "error" in documents["b.pdf"]
+
+def test_batch_types_select_the_detectors(client):
+    document = ("files", ("a.pdf", pdf_bytes("Email: a@example.com  PAN: ABCDE1234F"), "application/pdf"))
+    response = client.post("/batch/?types=PAN", files=[document])
+    assert response.status_code == 200
+    assert response.json()["documents"][0]["detected_data"] == {"PAN": ["ABCDE1234F"]}
+
+    response = client.post("/batch/?types=PAN,Nope", files=[document])
+    assert response.status_code == 400
+    assert "Nope" in response.json()["detail"]
+
+def test_batch_refuses_too_many_documents_before_reading_them(client, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_MAX_FILES", 2)
+    opened = []
+    monkeypatch.setattr(batch, "read_batch_document",
+                        lambda filename, size, open_source: opened.append(filename) or {"filename": filename})
+    archive = zip_bytes({f"{i}.pdf": pdf_bytes(str(i)) for i in range(5)})
+    response = client.post("/batch/", files=[("files", ("docs.zip", archive, "application/zip"))])
+    assert response.status_code == 400
+    assert opened == ["0.pdf", "1.pdf"]
+
+def test_batch_refuses_oversized_total_from_the_zip_directory(client, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_MAX_BYTES", 1000)
+    archive = zip_bytes({f"{i}.pdf": b"%PDF-1.4" + b" " * 600 for i in range(2)})
+    response = client.post("/batch/", files=[("files", ("docs.zip", archive, "application/zip"))])
+    assert response.status_code == 413
+    # The entry copied before the limit was hit is cleaned up
+    assert not [name for name in os.listdir(batch.content_store.tmp_dir) if name.endswith(".pdf")]
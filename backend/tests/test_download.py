@@ -0,0 +1,52 @@
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from routers.download import RangeNotSatisfiable, parse_range
+from services.storage import content_store
+
+DATA = bytes(range(256)) * 4
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def file_id():
+    file_id = str(uuid.uuid4())
+    content_store.put_bytes(file_id, "redacted", DATA)
+    return file_id
+
+def test_parse_range_edge_cases():
+    assert parse_range("bytes=-100", 1024) == (924, 1023)
+    assert parse_range("bytes=-5000", 1024) == (0, 1023)  # suffix longer than the file
+    assert parse_range("bytes=1000-", 1024) == (1000, 1023)
+    assert parse_range("bytes=1000-5000", 1024) == (1000, 1023)
+    assert parse_range("bytes=5-2", 1024) is None
+    assert parse_range("bytes=0-1,5-6", 1024) is None
+    assert parse_range("items=0-1", 1024) is None
+    for header in ("bytes=1024-", "bytes=2000-3000", "bytes=-0"):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range(header, 1024)
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=-10", 1014, 1023),
+    ("bytes=1000-", 1000, 1023),
+    ("bytes=0-0", 0, 0),
+])
+def test_range_is_served(client, file_id, header, start, end):
+    response = client.get(f"/download/{file_id}", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert response.content == DATA[start:end + 1]
+
+def test_range_past_the_end_is_416(client, file_id):
+    response = client.get(f"/download/{file_id}", headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(DATA)}"
+
+def test_ignored_range_sends_the_whole_file(client, file_id):
+    response = client.get(f"/download/{file_id}", headers={"Range": "bytes=0-1,5-6"})
+    assert response.status_code == 200
+    assert response.content == DATA
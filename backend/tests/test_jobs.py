@@ -0,0 +1,36 @@
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from services import jobs
+
+def pdf_bytes(text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def file_id(client):
+    response = client.post("/upload/", files={"file": ("a.pdf", pdf_bytes("Email: a@example.com"), "application/pdf")})
+    return response.json()["file_id"]
+
+def test_background_detection_returns_the_job(client, file_id):
+    response = client.post(f"/data/{file_id}?background=true")
+    assert response.status_code == 202
+    body = response.json()
+    assert body["file_id"] == file_id and body["status_url"] == f"/jobs/{body['job_id']}"
+    assert client.get(body["status_url"]).status_code == 200
+
+def test_full_queue_is_503(client, file_id, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_QUEUE_LIMIT", 0)
+    for url in (f"/data/{file_id}?background=true", f"/redact/{file_id}?background=true"):
+        response = client.post(url, json={"items_to_redact": {"Email": ["a@example.com"]}})
+        assert response.status_code == 503, url
+        assert response.headers["Retry-After"]
@@ -0,0 +1,80 @@
+import io
+import time
+import fitz
+import pytest
+from PIL import Image, ImageDraw
+from services import ocr
+from services.classifier import classify_page
+from services.layout import PageLayout
+
+IMAGE_BOX = fitz.Rect(100, 500, 500, 700)
+
+def scanned_page(rotation):
+    """A typed header over a scanned (image-only) body, with /Rotate set"""
+    scan = Image.new("L", (800, 400), 255)
+    ImageDraw.Draw(scan).rectangle((40, 40, 760, 360), fill=0)
+    buffer = io.BytesIO()
+    scan.save(buffer, "PNG")
+    doc = fitz.open()
+    page = doc.new_page(width=600, height=800)
+    page.insert_text((72, 72), "Account statement")
+    page.insert_image(IMAGE_BOX, stream=buffer.getvalue())
+    page.set_rotation(rotation)
+    return doc, page
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_rotated_scan_is_cropped_to_its_image(rotation, monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_MODE", "adaptive")
+    doc, page = scanned_page(rotation)
+    decision = classify_page(page, page.get_text("words"))
+    assert decision.needs_ocr
+    assert fitz.Rect(decision.regions[0]) == IMAGE_BOX
+
+    plan = ocr.render_plan(page, True, decision.regions)
+    img, to_page = ocr.render_for_ocr(page, plan)
+
+    # The crop holds the scan, not a blank strip of the page
+    histogram = img.histogram()
+    assert sum(histogram[:64]) > 0.5 * img.width * img.height
+    # and its pixels map back onto the image box, in text-layer coordinates
+    mapped = fitz.Rect(0, 0, img.width, img.height) * to_page
+    assert all(abs(a - b) < 1 for a, b in zip(mapped, IMAGE_BOX))
+    doc.close()
+
+def test_rotated_ocr_words_land_on_the_image(monkeypatch):
+    doc, page = scanned_page(90)
+    plan = ocr.render_plan(page, True, [tuple(IMAGE_BOX)])
+    img, to_page = ocr.render_for_ocr(page, plan)
+    # A word in the middle of the rendered crop, as Tesseract would report it
+    cx, cy = img.width / 2, img.height / 2
+    words = ocr.to_page_words([(cx - 10, cy - 5, cx + 10, cy + 5, "1234", 0, 0, 0)], to_page)
+    rect = PageLayout(words).rects_for(0, 4)[0]
+    assert IMAGE_BOX.contains(fitz.Rect(rect[:4]))
+    doc.close()
+
+def test_text_page_without_images_skips_ocr():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Account statement")
+    decision = classify_page(page, page.get_text("words"))
+    assert not decision.needs_ocr
+    assert decision.reason.startswith("text layer only")
+    assert decision.text_coverage > 0
+    doc.close()
+
+def test_busy_pool_is_healthy():
+    pool = ocr.OcrPool(1)
+    try:
+        pool.check()  # start the worker
+        busy = pool.submit(time.sleep, 3)
+        status = pool.check(timeout=0.5)
+        assert status["last_check"]["healthy"] and status["last_check"]["busy"]
+
+        # No page finished for longer than a page may take: stuck, not busy
+        pool.last_progress -= ocr.OCR_PAGE_TIMEOUT
+        assert not pool.check(timeout=0.5)["last_check"]["healthy"]
+        busy.result()
+        status = pool.check()
+        assert status["last_check"]["healthy"] and not status["last_check"]["busy"]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,50 @@
+import fitz
+from routers.detect import detect_sensitive_data_debug
+from routers.redact import perform_redaction
+from services.analysis import load_analysis
+from services.cache import file_sha256
+from services.scanner import DETECTOR_VERSION
+
+ACCOUNT = "123456789012"
+
+# Keeps each page's number out of the keyword context of the others
+FILLER = "Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod"
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for text in pages:
+        page = doc.new_page()
+        page.insert_text((72, 72), FILLER, fontsize=10)
+        page.insert_text((72, 100), text, fontsize=12)
+        page.insert_text((72, 128), FILLER, fontsize=10)
+    doc.save(str(path))
+    doc.close()
+
+def test_indexed_value_is_redacted_where_detection_did_not_validate_it(tmp_path):
+    # Only page 1 has the context that makes the number a bank account
+    source = tmp_path / "statement.pdf"
+    make_pdf(source, [f"Savings Account No: {ACCOUNT}", f"Reference number {ACCOUNT}"])
+    detection = detect_sensitive_data_debug(str(source), use_cache=False)
+    assert ACCOUNT in detection["detected_data"]["Bank_Account"]
+    analysis = load_analysis(file_sha256(str(source)), DETECTOR_VERSION)
+    assert {page for page, *_ in analysis.lookup_rects("Bank_Account", ACCOUNT)} == {1}
+
+    output = tmp_path / "redacted.pdf"
+    result = perform_redaction(str(source), str(output), {"Bank_Account": [ACCOUNT]}, analysis)
+
+    assert result["indexed_items"] == 1
+    assert result["pages_redacted"] == 2
+    with fitz.open(str(output)) as doc:
+        for page in doc:
+            assert ACCOUNT not in page.get_text()
+
+def test_boxes_are_not_doubled_where_index_and_search_agree(tmp_path):
+    source = tmp_path / "statement.pdf"
+    make_pdf(source, [f"Savings Account No: {ACCOUNT}"])
+    detect_sensitive_data_debug(str(source), use_cache=False)
+    analysis = load_analysis(file_sha256(str(source)), DETECTOR_VERSION)
+
+    result = perform_redaction(str(source), str(tmp_path / "redacted.pdf"),
+                               {"Bank_Account": [ACCOUNT]}, analysis)
+
+    assert result["redacted_count"] == 1
@@ -0,0 +1,42 @@
+import json
+import pytest
+from services.detectors import DetectorRegistry, load_rules
+from services.scanner import Scanner
+
+CUSTOM_RULES = [
+    {"name": "GSTIN", "pattern": r'\b\d{2}[A-Z]{5}\d{4}[A-Z][A-Z\d]Z[A-Z\d]\b'},
+    {"name": "Reference", "pattern": r'\d{4}[A-Z]{2}'},
+    {"name": "PIN_Code", "pattern": r'\b[1-9]\d{2}\s?\d{3}\b'},
+    {"name": "Signed_Amount", "pattern": r'-?\d{6,}'},
+    # Overrides of built-in rules with patterns of another shape
+    {"name": "Bank_Account", "pattern": r'\b\d{6,18}\b'},
+    {"name": "Phone", "pattern": r'Tel:?\s*\+?\d[\d\s]{8,}\d'},
+]
+
+TEXTS = [
+    "Acct 123456789 27ABCDE1234F1Z5",
+    "12345678901234AB",
+    "PIN 560 001, amount -1234567 and 7654321",
+    "Savings A/c 123456, Tel: +91 98765 43210",
+    "ABCDE1234F a@b.com +91 9876543210 123456789012 4111 1111 1111 1111",
+]
+
+@pytest.fixture(scope="module")
+def custom_registry(tmp_path_factory):
+    config = tmp_path_factory.mktemp("config") / "detectors.json"
+    config.write_text(json.dumps(CUSTOM_RULES))
+    return DetectorRegistry(load_rules(str(config)))
+
+def test_custom_patterns_are_scanned_as_configured(custom_registry):
+    detectors = custom_registry.select(["PIN_Code", "Signed_Amount", "Phone"])
+    text = TEXTS[2] + "; " + TEXTS[3]
+    found = Scanner(detectors).scan(text)
+    assert [match.text for match in found["PIN_Code"]] == ["560 001", "123456"]
+    assert [match.text for match in found["Signed_Amount"]] == ["-1234567", "7654321", "123456"]
+    assert [match.text for match in found["Phone"]] == ["Tel: +91 98765 43210"]
+    assert all(text[match.start:match.end] == match.text for matches in found.values() for match in matches)
+
+def test_reported_misses_are_found(custom_registry):
+    scanner = Scanner(custom_registry.select())
+    assert [match.text for match in scanner.scan(TEXTS[0])["GSTIN"]] == ["27ABCDE1234F1Z5"]
+    assert [match.text for match in scanner.scan(TEXTS[1])["Reference"]] == ["1234AB"]
@@ -0,0 +1,73 @@
+import os
+import pytest
+from services import analysis, storage
+from services.analysis import (Analysis, AnalysisWriter, PageRecord, analysis_exists, load_analysis,
+                               save_analysis)
+from services.storage import ContentStore
+from services.storage_backends import MemoryBackend
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # A remote-style backend: blobs are only read through a local cache
+    store = ContentStore(str(tmp_path), 3600, 1024 ** 3, MemoryBackend(str(tmp_path / "cache")))
+    monkeypatch.setattr(analysis, "content_store", store)
+    return store
+
+def test_identical_files_share_a_blob(store):
+    first = store.put_bytes("file-1", "upload", b"%PDF-1.4 document")
+    second = store.put_bytes("file-2", "upload", b"%PDF-1.4 document")
+    assert (first["duplicate"], second["duplicate"]) == (False, True)
+    assert store.stats()["blobs"] == 1
+    assert os.listdir(store.tmp_dir) == []
+
+    store.delete("file-1")
+    assert store.read_bytes("file-2", "upload") == b"%PDF-1.4 document"
+
+def test_analysis_artifact_lives_in_the_backend(store):
+    stored = store.put_bytes("file-1", "upload", b"%PDF-1.4 document")
+    save_analysis(stored["sha256"], Analysis("8", 1, [], []))
+
+    # Local copies (the GC evicts them after TMP_MAX_AGE) are not the artifact
+    store.path_for("file-1", "upload")
+    store.backend.evict_cache(0)
+    assert load_analysis(stored["sha256"], "8").page_count == 1
+    assert load_analysis(stored["sha256"], "7") is None
+
+def test_analysis_artifact_goes_with_its_document(store):
+    stored = store.put_bytes("file-1", "upload", b"%PDF-1.4 document")
+    save_analysis(stored["sha256"], Analysis("8", 1, [], []))
+
+    store.delete("file-1")
+    assert load_analysis(stored["sha256"], "8") is None
+    assert store.stats()["blobs"] == 0
+
+def test_analysis_artifact_written_page_by_page(store):
+    stored = store.put_bytes("file-1", "upload", b"%PDF-1.4 document")
+    writer = AnalysisWriter(stored["sha256"], "8")
+    for number in (1, 2):
+        writer.add_page(PageRecord(number, characters=10 * number))
+    assert not analysis_exists(stored["sha256"], "8")
+
+    writer.finish({"debug_info": {"page_count": 2}, "locations": {
+        "email": [{"value": "a@example.com", "page": 2, "start": 0, "end": 13}]
+    }})
+    assert analysis_exists(stored["sha256"], "8")
+    assert not analysis_exists(stored["sha256"], "7")
+    loaded = load_analysis(stored["sha256"], "8")
+    assert [page.characters for page in loaded.pages] == [10, 20]
+    assert [finding.value for finding in loaded.findings] == ["a@example.com"]
+
+def test_discarded_analysis_artifact_leaves_nothing(store):
+    stored = store.put_bytes("file-1", "upload", b"%PDF-1.4 document")
+    writer = AnalysisWriter(stored["sha256"], "8")
+    writer.add_page(PageRecord(1))
+    writer.discard()
+    assert load_analysis(stored["sha256"], "8") is None
+    assert not [name for name in os.listdir(store.tmp_dir) if name.endswith(".msgpack")]
+
+def test_database_on_a_network_filesystem_is_refused(tmp_path, monkeypatch):
+    assert storage.filesystem_type(str(tmp_path)) not in storage.NETWORK_FILESYSTEMS
+    monkeypatch.setattr(storage, "filesystem_type", lambda path: "nfs4")
+    store = ContentStore(str(tmp_path), 3600, 1024 ** 3, MemoryBackend(str(tmp_path / "cache")))
+    with pytest.raises(RuntimeError, match="nfs4"):
+        store.stats()
@@ -0,0 +1,44 @@
+import os
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from routers import upload
+
+def pdf_bytes(text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+def test_header_after_leading_bytes_is_accepted(client):
+    response = client.post("/upload/", files={"file": ("a.pdf", b"\r\n" + pdf_bytes("text"), "application/pdf")})
+    assert response.status_code == 200
+    assert upload.sniff_pdf(b"\r\n%PDF-1.7\n" + b"x" * 2000) is None
+
+def test_file_without_header_is_rejected(client):
+    response = client.post("/upload/", files={"file": ("a.pdf", b"GIF89a" + b"x" * 2000, "application/pdf")})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Only PDF files are allowed")
+
+def test_oversize_upload_is_rejected(client):
+    pdf = pdf_bytes("text")
+    oversize = pdf + b" " * (upload.MAX_UPLOAD_SIZE + upload.MULTIPART_OVERHEAD)
+    response = client.post("/upload/", files={"file": ("a.pdf", oversize, "application/pdf")})
+    assert response.status_code == 413
+    assert not [name for name in os.listdir(upload.content_store.tmp_dir) if name.endswith(".part")]
+
+def test_upload_writer_stops_at_the_limit(tmp_path):
+    writer = upload.PdfUploadWriter(str(tmp_path / "upload.part"), max_size=2048)
+    writer.write(pdf_bytes("text")[:1024])
+    with pytest.raises(upload.UploadRejected) as rejected:
+        writer.write(b" " * 2048)
+    assert rejected.value.status_code == 413
+    writer.discard()
+    assert not os.path.exists(writer.path)
@@ -0,0 +1,32 @@
+from services import validators
+from services.validators import (is_likely_aadhaar, is_likely_credit_card, luhn_check_digit, luhn_valid,
+                                 verhoeff_check_digit, verhoeff_valid)
+
+def test_luhn():
+    assert luhn_valid("79927398713")
+    assert luhn_valid("4111111111111111")
+    assert not luhn_valid("4111111111111112")
+    assert not luhn_valid("79927398731")  # adjacent digits swapped
+    assert luhn_check_digit("7992739871") == "3"
+
+def test_verhoeff():
+    assert verhoeff_valid("2363")
+    assert not verhoeff_valid("2364")
+    assert not verhoeff_valid("2633")  # adjacent digits swapped: Luhn's blind spot
+    assert verhoeff_check_digit("236") == "3"
+    for digits in ("0", "12345", "98765432101"):
+        assert verhoeff_valid(digits + verhoeff_check_digit(digits))
+
+def test_card_and_aadhaar_need_their_check_digit():
+    aadhaar = "23412341234" + verhoeff_check_digit("23412341234")
+    wrong_digit = str((int(aadhaar[-1]) + 1) % 10)
+    assert is_likely_aadhaar(f"{aadhaar[:4]} {aadhaar[4:8]} {aadhaar[8:]}")
+    assert not is_likely_aadhaar(aadhaar[:-1] + wrong_digit)
+    assert not is_likely_aadhaar("1" + aadhaar[1:-1] + verhoeff_check_digit("1" + aadhaar[1:-1]))
+    assert is_likely_credit_card("4111-1111-1111-1111")
+    assert not is_likely_credit_card("4111 1111 1111 1112")
+
+def test_checksums_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(validators, "CHECKSUMS", False)
+    assert is_likely_credit_card("4111 1111 1111 1112")
+    assert is_likely_aadhaar("2341 2341 2340")